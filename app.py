@@ -1,12 +1,32 @@
 from flask import Flask, render_template, request, redirect, url_for
+import atexit
+import bisect
+import copy
+import cProfile
+import csv
+import glob
+import hashlib
+import io
+import itertools
 import json
+import mmap
 import os
+import pstats
+import random
+import sqlite3
 import subprocess
+import sys
+import tempfile
 import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-from flask import Response
+from flask import Response, make_response, before_render_template, template_rendered
+from werkzeug.http import is_resource_modified
 
 try:
     from dotenv import load_dotenv
@@ -14,6 +34,16 @@ try:
 except ImportError:
     print("python-dotenv not installed, using environment variables directly")
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # no cross-process locking on Windows
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # optional: matrix Mom's House deltas for big events
+
 print("RUNNING FROM:", os.getcwd())
 print("APP FILE:", __file__)
 print(">>> LOADED FLASK APP FROM:", __file__)
@@ -22,10 +52,29 @@ print(">>> LOADED FLASK APP FROM:", __file__)
 
 app = Flask(__name__)
 
-push_queue = []
+push_queue = []  # (queued_at, commit message), oldest first
 is_pushing = False
 push_log = []  # Stores recent push messages
 MAX_LOGS = 20
+
+# Git sync: one background worker per process turns every submission queued
+# within the debounce window into a single commit and push
+PUSH_DEBOUNCE_SECONDS = float(os.getenv("PUSH_DEBOUNCE_SECONDS", "10"))
+PUSH_MAX_DELAY_SECONDS = float(os.getenv("PUSH_MAX_DELAY_SECONDS", "60"))
+PUSH_BACKOFF_SECONDS = 15          # first retry after a failed push, doubling
+PUSH_BACKOFF_MAX_SECONDS = 900
+push_condition = threading.Condition()
+push_thread = None
+push_stats = {
+    "pushes": 0,
+    "failures": 0,              # consecutive
+    "failed_pushes": 0,         # total
+    "retry_at": None,
+    "unpushed": False,          # committed, but the push failed
+    "last_push_at": None,
+    "last_push_latency": None,  # seconds spent in git add/commit/push
+    "last_push_lag": None,      # seconds from the oldest submission to pushed
+}
 # Admin login credentials loaded from environment variables
 def load_admin_credentials():
     """Load admin credentials from environment variables."""
@@ -59,25 +108,37 @@ DECAY_START_DAYS = 14
 DECAY_PER_DAY = 2      # total global decay per day
 CHAR_FLOOR = 1000
 
-def apply_decay_to_player(player_data):
-    """Safely decays only real character ratings."""
-    
+def apply_decay_to_player(player_data, today=None):
+    """Safely decays only real character ratings.
+
+    Decay runs from DECAY_START_DAYS after last_played (set by rate_match,
+    which also clears decay_through), or from the last time it was
+    materialized ("decay_through"), so applying it twice on the same day
+    is a no-op. Returns True if any rating changed.
+    """
+
     last_played_str = player_data.get("last_played")
     if not last_played_str:
-        return
+        return False
 
     try:
         last_played = datetime.strptime(last_played_str, "%Y-%m-%d").date()
     except:
-        return
+        return False
 
-    today = datetime.now().date()
-    inactive_days = (today - last_played).days
+    today = today or datetime.now().date()
+    decay_start = last_played + timedelta(days=DECAY_START_DAYS)
 
-    if inactive_days <= DECAY_START_DAYS:
-        return
+    try:
+        decay_through = datetime.strptime(player_data["decay_through"], "%Y-%m-%d").date()
+        decay_start = max(decay_start, decay_through)
+    except (KeyError, TypeError, ValueError):
+        pass
 
-    days_of_decay = inactive_days - DECAY_START_DAYS
+    days_of_decay = (today - decay_start).days
+
+    if days_of_decay <= 0:
+        return False
 
     # Only decay TRUE characters
     char_keys = [
@@ -86,7 +147,7 @@ def apply_decay_to_player(player_data):
     ]
 
     if not char_keys:
-        return
+        return False
 
     # decay per character per day
     decay_per_char = DECAY_PER_DAY / len(char_keys)
@@ -98,56 +159,215 @@ def apply_decay_to_player(player_data):
         new_val = player_data[c] - total_decay
         player_data[c] = max(CHAR_FLOOR, int(new_val))
 
+    player_data["decay_through"] = today.strftime("%Y-%m-%d")
+    return True
+
+
+# Effective (decayed) ratings are derived on read and memoized per day;
+# characters.json only changes when materialize_decay() runs.
+_decay_view = {"source": None, "day": None, "players": None}
+_decay_view_lock = threading.Lock()
+
+def effective_players(today=None):
+    """load_players() with pending decay applied virtually. Read-only snapshot."""
+    source = load_players()
+    today = today or datetime.now().date()
+
+    with _decay_view_lock:
+        if _decay_view["source"] is source and _decay_view["day"] == today:
+            return _decay_view["players"]
+
+    view = {}
+    for pname, pdata in source.items():
+        decayed = dict(pdata)
+        view[pname] = decayed if apply_decay_to_player(decayed, today) else pdata
+
+    with _decay_view_lock:
+        _decay_view.update(source=source, day=today, players=view)
+    return view
+
+# The same ratings as a dense players x CHARACTERS matrix, rebuilt along
+# with the decay view. Cells hold rating - 1000 (0 where unrated), so a
+# player's global ELO is the sum of their row.
+_ratings_matrix = {"players": None, "matrix": None}
+
+def ratings_matrix():
+    """{"names", "ids", "deviation" (array indexed player * len(CHARACTERS) +
+    character), "rated" (bytearray, same layout), "global" (row sums)}."""
+    players = effective_players()
+    with _decay_view_lock:
+        if _ratings_matrix["players"] is players:
+            return _ratings_matrix["matrix"]
+
+    n_chars = len(CHARACTERS)
+    char_ids = {c: i for i, c in enumerate(CHARACTERS)}
+    names = list(players)
+    deviation = array("i", [0]) * (len(names) * n_chars)
+    rated = bytearray(len(deviation))
+    global_elo = array("i", [0]) * len(names)
+    for pid, name in enumerate(names):
+        base = pid * n_chars
+        for char, value in players[name].items():
+            cid = char_ids.get(char)
+            # Only real character ratings (not badges, last_played, ...)
+            if cid is not None and isinstance(value, (int, float)):
+                deviation[base + cid] = int(value) - 1000
+                rated[base + cid] = 1
+        global_elo[pid] = sum(deviation[base:base + n_chars])
+
+    matrix = {
+        "names": names,
+        "ids": {name: pid for pid, name in enumerate(names)},
+        "deviation": deviation,
+        "rated": rated,
+        "global": global_elo,
+    }
+    with _decay_view_lock:
+        _ratings_matrix.update(players=players, matrix=matrix)
+    return matrix
+
+def materialize_decay(today=None):
+    """Writes today's decay into characters.json. Safe to run repeatedly."""
+    with data_lock():
+        data = copy.deepcopy(load_players())
+        changed = False
+        for pname, pdata in data.items():
+            changed = apply_decay_to_player(pdata, today) or changed
+
+        if changed:
+            save_players(data)
+            bump_data_version()
+    return changed
+
+
+def log_push(message):
+    msg = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}"
+    print(msg)
+    push_log.append(msg)
+    if len(push_log) > MAX_LOGS:
+        push_log.pop(0)
+
+def batch_commit_message(messages):
+    """One subject line for a batch: "Auto-update from match submission (x3); ..." """
+    counts = {}
+    for message in messages:
+        counts[message] = counts.get(message, 0) + 1
+    return "; ".join(m if n == 1 else f"{m} (x{n})" for m, n in counts.items())
+
+def sync_to_github(commit_message):
+    """git add/commit/push. Returns False when there was nothing to push."""
+    # The database isn't tracked; git gets the JSON export
+    if STORAGE_BACKEND == "sqlite":
+        export_json()
+
+    subprocess.run(["git", "add", "-u"], check=True)
+
+    # Journal segments are new files, which "git add -u" skips
+    journal_files = journal_segments(MATCH_LOG_JOURNAL) + journal_segments(MOMS_HOUSE_LOG_JOURNAL)
+    if journal_files:
+        subprocess.run(["git", "add", "--"] + journal_files)
+
+    diff_check = subprocess.run(["git", "diff", "--cached", "--quiet"])
+    if diff_check.returncode != 0:
+        subprocess.run(["git", "commit", "-m", commit_message], check=True)
+        push_stats["unpushed"] = True
+
+    # A commit from a failed attempt still needs pushing
+    if not push_stats["unpushed"]:
+        return False
+    subprocess.run(["git", "push", "origin", "main"], check=True)
+    push_stats["unpushed"] = False
+    return True
+
+def take_push_batch():
+    """Blocks until the queue has been quiet for PUSH_DEBOUNCE_SECONDS (and any
+    backoff is over), then empties it. Call with push_condition held."""
+    while True:
+        if not push_queue:
+            push_condition.wait()
+            continue
+        # A steady stream of submissions still syncs every PUSH_MAX_DELAY_SECONDS
+        due = min(push_queue[-1][0] + PUSH_DEBOUNCE_SECONDS,
+                  push_queue[0][0] + PUSH_MAX_DELAY_SECONDS)
+        if push_stats["retry_at"]:
+            due = max(due, push_stats["retry_at"])
+        wait = due - time.time()
+        if wait <= 0:
+            batch = list(push_queue)
+            del push_queue[:]
+            return batch
+        push_condition.wait(wait)
 
 def push_to_github_worker():
+    """The process's single sync loop: one commit and push per batch of submissions."""
     global is_pushing
 
-    if is_pushing:
-        return
-
-    is_pushing = True
-
-    while push_queue:
-        commit_message = push_queue.pop(0)
+    while True:
+        with push_condition:
+            batch = take_push_batch()
+            is_pushing = True
 
+        commit_message = batch_commit_message([message for _, message in batch])
+        started = time.time()
         try:
-            subprocess.run(["git", "add", "-u"], check=True)
-
-            diff_check = subprocess.run(["git", "diff", "--cached", "--quiet"])
-            if diff_check.returncode == 0:
-                msg = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No changes to commit ({commit_message})"
-                print(msg)
-                push_log.append(msg)
-                if len(push_log) > MAX_LOGS:
-                    push_log.pop(0)
-                continue
-
-            subprocess.run(["git", "commit", "-m", commit_message], check=True)
-            subprocess.run(["git", "push", "origin", "main"], check=True)
-
-            msg = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Git push successful: {commit_message}"
-            print(msg)
-            push_log.append(msg)
-            if len(push_log) > MAX_LOGS:
-                push_log.pop(0)
-
-        except subprocess.CalledProcessError as e:
-            msg = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Git push FAILED: {e}"
-            print(msg)
-            push_log.append(msg)
-            if len(push_log) > MAX_LOGS:
-                push_log.pop(0)
-
-    is_pushing = False
-
-
-
+            # Other gunicorn workers run their own sync loop on the same checkout
+            with file_lock(GIT_LOCK_FILE):
+                pushed = sync_to_github(commit_message)
+        except (subprocess.CalledProcessError, sqlite3.Error, OSError) as e:
+            with push_condition:
+                push_queue[:0] = batch      # retried with the next batch
+                push_stats["failures"] += 1
+                push_stats["failed_pushes"] += 1
+                delay = min(PUSH_BACKOFF_SECONDS * 2 ** (push_stats["failures"] - 1),
+                            PUSH_BACKOFF_MAX_SECONDS)
+                push_stats["retry_at"] = time.time() + delay
+                is_pushing = False
+            log_push(f"Git push FAILED: {e} (retrying in {delay:.0f}s)")
+            continue
 
+        finished = time.time()
+        with push_condition:
+            push_stats.update(failures=0, retry_at=None)
+            if pushed:
+                push_stats.update(
+                    pushes=push_stats["pushes"] + 1,
+                    last_push_at=finished,
+                    last_push_latency=finished - started,
+                    last_push_lag=finished - batch[0][0],
+                )
+            is_pushing = False
+
+        if pushed:
+            log_push(f"Git push successful: {commit_message}")
+        else:
+            log_push(f"No changes to commit ({commit_message})")
 
 def queue_push(commit_message="Auto-update from match submission"):
-    """Adds a push request to the queue and starts worker if one isn't running."""
-    push_queue.append(commit_message)
-    threading.Thread(target=push_to_github_worker).start()
+    """Queues a commit for the sync worker, starting it on first use."""
+    global push_thread
+
+    with push_condition:
+        push_queue.append((time.time(), commit_message))
+        if push_thread is None or not push_thread.is_alive():
+            push_thread = threading.Thread(target=push_to_github_worker, daemon=True)
+            push_thread.start()
+        push_condition.notify()
+
+def flush_push_queue():
+    """Syncs whatever is still queued (at shutdown, so nothing waits out the debounce)."""
+    with push_condition:
+        batch = list(push_queue)
+        del push_queue[:]
+    if not batch:
+        return
+    commit_message = batch_commit_message([message for _, message in batch])
+    try:
+        with file_lock(GIT_LOCK_FILE):
+            sync_to_github(commit_message)
+    except (subprocess.CalledProcessError, sqlite3.Error, OSError) as e:
+        log_push(f"Git push FAILED at shutdown: {e}")
+
+atexit.register(flush_push_queue)
 
 
 # Detect Render environment
@@ -166,6 +386,40 @@ MOMS_HOUSE_FILE = f"{DATA_DIR}/moms_house.json"
 MOMS_HOUSE_LOG_FILE = f"{DATA_DIR}/moms_house_log.json"
 MOMS_HOUSE_LAST_FILE = f"{DATA_DIR}/moms_house_last_result.json"
 
+# Append-only journals for the match logs (one JSON record per line).
+# When a journal exists it replaces the JSON array file above, so a
+# submission appends one line instead of rewriting the whole history.
+# Convert existing logs once with migrate_match_log.py.
+MATCH_LOG_JOURNAL = f"{DATA_DIR}/match_log.jsonl"
+MOMS_HOUSE_LOG_JOURNAL = f"{DATA_DIR}/moms_house_log.jsonl"
+
+# Seal the active journal into a numbered segment once it reaches this
+# many bytes (0 = never roll over)
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", "0"))
+
+# Derived per-player stats, kept in step with the logs (safe to delete;
+# they are rebuilt from the logs on the next read)
+MATCH_STATS_FILE = f"{DATA_DIR}/match_stats.json"
+MOMS_HOUSE_STATS_FILE = f"{DATA_DIR}/moms_house_stats.json"
+
+# Replay checkpoints (derived, see "Rating checkpoints" below)
+CHECKPOINT_DIR = f"{DATA_DIR}/checkpoints"
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "500"))
+
+# Columnar binary copy of the match log for analytics scans (derived, see
+# "Columnar match store" below); MATCH_COLUMNS=1 keeps it current on append
+MATCH_COLUMNS_DIR = f"{DATA_DIR}/columns"
+MATCH_COLUMNS = os.getenv("MATCH_COLUMNS", "0") == "1"
+
+# Global data version, bumped by every change to what the pages show
+# (drives ETag / Last-Modified, see "Conditional GET" below)
+DATA_VERSION_FILE = f"{DATA_DIR}/data_version.json"
+
+# Storage backend: "json" (the files above) or "sqlite" (SQLITE_FILE, with
+# the JSON files exported before each push; see "SQLite backend" below)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_FILE = f"{DATA_DIR}/elo.db"
+
 
 # run with alias "runelo" in terminal
 
@@ -174,67 +428,1362 @@ MOMS_HOUSE_LAST_FILE = f"{DATA_DIR}/moms_house_last_result.json"
 # -----------------------------
 
 def load_players():
-    if not os.path.exists(DATA_FILE):
-        return {}
-    try:
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {}
+    """Shared snapshot of characters.json; copy it before mutating."""
+    if STORAGE_BACKEND == "sqlite":
+        return db_load_players()
+    def read():
+        try:
+            return read_json(DATA_FILE)
+        except:
+            return {}
+    return cached_load(DATA_FILE, [DATA_FILE], read)
 
 def save_players(players):
-    with open(DATA_FILE, "w") as f:
-        json.dump(players, f, indent=4)
+    if STORAGE_BACKEND == "sqlite":
+        return db_save_players(players)
+    write_json_atomic(DATA_FILE, players)
 
 def save_last_result(result):
-    with open(LAST_RESULT_FILE, "w") as f:
-        json.dump(result, f, indent=4)
+    if STORAGE_BACKEND == "sqlite":
+        return db_save_document("last_result", result)
+    write_json_atomic(LAST_RESULT_FILE, result)
 
 def load_last_result():
+    if STORAGE_BACKEND == "sqlite":
+        return db_load_document("last_result")
+    def read():
+        return read_json(LAST_RESULT_FILE)
     if not os.path.exists(LAST_RESULT_FILE):
         return {}
-    with open(LAST_RESULT_FILE, "r") as f:
-        return json.load(f)
+    return cached_load(LAST_RESULT_FILE, [LAST_RESULT_FILE], read)
 
 def load_match_log():
+    """Shared snapshot of the match log; copy entries before mutating."""
+    if STORAGE_BACKEND == "sqlite":
+        return db_load_log("matches")
+    if journal_segments(MATCH_LOG_JOURNAL):
+        return load_journal(MATCH_LOG_JOURNAL)
     if not os.path.exists(MATCH_LOG_FILE):
         return []
-    with open(MATCH_LOG_FILE, "r") as f:
-        return json.load(f)
+    def read():
+        return read_json(MATCH_LOG_FILE)
+    return cached_load(MATCH_LOG_FILE, [MATCH_LOG_FILE], read)
+
+def _write_match_log(log):
+    if journal_segments(MATCH_LOG_JOURNAL):
+        write_journal(MATCH_LOG_JOURNAL, log)
+        return
+    write_json_atomic(MATCH_LOG_FILE, log)
 
 def save_match_log(log):
-    with open(MATCH_LOG_FILE, "w") as f:
-        json.dump(log, f, indent=4)
+    """Replaces the whole match log. Use append_match for new matches."""
+    if STORAGE_BACKEND == "sqlite":
+        db_write_log("matches", log)
+    else:
+        _write_match_log(log)
+    # Index positions no longer line up with the rewritten log
+    reset_stats_index(MATCH_STATS_FILE)
+    reset_match_columns()
+
+def append_match(entry):
+    """Adds one match to the log (a single fsync'd append in journal mode)."""
+    append_matches([entry])
+
+def append_matches(entries):
+    """Adds matches to the log in one write: one fsync'd append in journal
+    mode, one transaction with SQLite, one rewrite of the JSON file."""
+    first = match_table()["length"] + 1
+    for seq, entry in enumerate(entries, start=first):
+        normalize_match(entry, seq)
+
+    if STORAGE_BACKEND == "sqlite":
+        db_append_log("matches", *entries)
+    elif journal_segments(MATCH_LOG_JOURNAL):
+        append_journal(MATCH_LOG_JOURNAL, *entries)
+    else:
+        # Read uncached: the app keeps the match table, not the parsed log
+        log = read_json(MATCH_LOG_FILE) if os.path.exists(MATCH_LOG_FILE) else []
+        log.extend(entries)
+        _write_match_log(log)
+
+    # Fold the new matches into the stats index, checkpoint if due
+    load_match_stats()
+    update_checkpoints()
+    if MATCH_COLUMNS:
+        update_match_columns()
+
+def recent_match_entries(count):
+    """The last `count` matches, newest first, without loading the whole log
+    (journal and SQLite storage; the JSON array file has to be parsed)."""
+    if STORAGE_BACKEND == "sqlite":
+        return db_read_log_tail("matches", count)[::-1]
+    segments = journal_segments(MATCH_LOG_JOURNAL)
+    if segments:
+        key = f"{MATCH_LOG_JOURNAL}:tail:{count}"
+        return cached_load(key, segments, lambda: read_journal_tail(MATCH_LOG_JOURNAL, count)[::-1])
+    if count <= TABLE_TAIL:
+        table = match_table()
+        with _match_table_lock:
+            return list(table["tail"])[::-1][:count]
+    return load_match_log()[-count:][::-1]
+
+def match_log_stamp():
+    """Changes whenever the match log does (see load_stats_index)."""
+    if STORAGE_BACKEND == "sqlite":
+        return ["sqlite"] + list(db_version(db_connect(), "matches"))
+    return [list(stamp) for stamp in file_stamp(journal_segments(MATCH_LOG_JOURNAL) or [MATCH_LOG_FILE])]
+
+def moms_house_log_stamp():
+    if STORAGE_BACKEND == "sqlite":
+        return ["sqlite"] + list(db_version(db_connect(), "moms_house_events"))
+    return [list(stamp) for stamp in file_stamp(journal_segments(MOMS_HOUSE_LOG_JOURNAL) or [MOMS_HOUSE_LOG_FILE])]
 
 def load_moms_house():
+    """Shared snapshot of moms_house.json; copy it before mutating."""
+    if STORAGE_BACKEND == "sqlite":
+        return db_load_moms_house()
+    def read():
+        return read_json(MOMS_HOUSE_FILE)
     if not os.path.exists(MOMS_HOUSE_FILE):
         return {}
-    with open(MOMS_HOUSE_FILE, "r") as f:
-        return json.load(f)
+    return cached_load(MOMS_HOUSE_FILE, [MOMS_HOUSE_FILE], read)
 
 def save_moms_house(data):
-    with open(MOMS_HOUSE_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    if STORAGE_BACKEND == "sqlite":
+        return db_save_moms_house(data)
+    write_json_atomic(MOMS_HOUSE_FILE, data)
 
 def load_moms_house_log():
+    if STORAGE_BACKEND == "sqlite":
+        return db_load_log("moms_house_events")
+    if journal_segments(MOMS_HOUSE_LOG_JOURNAL):
+        return load_journal(MOMS_HOUSE_LOG_JOURNAL)
     if not os.path.exists(MOMS_HOUSE_LOG_FILE):
         return []
-    with open(MOMS_HOUSE_LOG_FILE, "r") as f:
-        return json.load(f)
+    def read():
+        return read_json(MOMS_HOUSE_LOG_FILE)
+    return cached_load(MOMS_HOUSE_LOG_FILE, [MOMS_HOUSE_LOG_FILE], read)
+
+def _write_moms_house_log(log):
+    if journal_segments(MOMS_HOUSE_LOG_JOURNAL):
+        write_journal(MOMS_HOUSE_LOG_JOURNAL, log)
+        return
+    write_json_atomic(MOMS_HOUSE_LOG_FILE, log)
 
 def save_moms_house_log(log):
-    with open(MOMS_HOUSE_LOG_FILE, "w") as f:
-        json.dump(log, f, indent=4)
+    if STORAGE_BACKEND == "sqlite":
+        db_write_log("moms_house_events", log)
+    else:
+        _write_moms_house_log(log)
+    reset_stats_index(MOMS_HOUSE_STATS_FILE)
+
+def append_moms_house_log(entry):
+    if STORAGE_BACKEND == "sqlite":
+        db_append_log("moms_house_events", entry)
+    elif journal_segments(MOMS_HOUSE_LOG_JOURNAL):
+        append_journal(MOMS_HOUSE_LOG_JOURNAL, entry)
+    else:
+        log = list(load_moms_house_log())
+        log.append(entry)
+        _write_moms_house_log(log)
+
+    load_moms_house_stats()
 
 def load_moms_house_last_result():
+    if STORAGE_BACKEND == "sqlite":
+        return db_load_document("moms_house_last_result")
     if not os.path.exists(MOMS_HOUSE_LAST_FILE):
         return {}
-    with open(MOMS_HOUSE_LAST_FILE, "r") as f:
-        return json.load(f)
+    return read_json(MOMS_HOUSE_LAST_FILE)
 
 def save_moms_house_last_result(result):
-    with open(MOMS_HOUSE_LAST_FILE, "w") as f:
-        json.dump(result, f, indent=4)
+    if STORAGE_BACKEND == "sqlite":
+        return db_save_document("moms_house_last_result", result)
+    write_json_atomic(MOMS_HOUSE_LAST_FILE, result)
+
+
+# -----------------------------
+# Request instrumentation
+# -----------------------------
+# Every request's time is split into load (reading and parsing stored data),
+# save (writes), render (templates) and compute (everything else), along
+# with the file bytes read and written. Per-route totals and the latest
+# requests are kept per worker process and shown on /admin. A sample of
+# requests (PROFILE_SAMPLE_RATE, e.g. 0.05) also runs under cProfile, and
+# the profiles of the slowest ones are kept.
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILES_KEPT = 5
+ROUTE_SAMPLES = 200     # latest durations per route, for the p95
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)   # seconds
+
+_request_timer = threading.local()
+_request_stats_lock = threading.Lock()
+_profile_lock = threading.Lock()    # one cProfile at a time per process
+request_stats = {}                  # route -> totals
+recent_requests = deque(maxlen=50)
+slow_profiles = []                  # slowest sampled requests first
+
+def start_phase(phase):
+    current = getattr(_request_timer, "current", None)
+    if current is not None:
+        current["stack"].append([phase, time.perf_counter(), 0.0])
+
+def end_phase():
+    current = getattr(_request_timer, "current", None)
+    if not current or not current["stack"]:
+        return
+    phase, started, nested = current["stack"].pop()
+    elapsed = time.perf_counter() - started
+    # Nested phases (a load inside a save, ...) only count once
+    current["phases"][phase] += elapsed - nested
+    if current["stack"]:
+        current["stack"][-1][2] += elapsed
+
+@contextmanager
+def timed(phase):
+    """Charges the time spent inside to `phase` of the current request."""
+    start_phase(phase)
+    try:
+        yield
+    finally:
+        end_phase()
+
+def count_io(kind, size):
+    """Adds `size` bytes to the current request's "read" or "written" total."""
+    current = getattr(_request_timer, "current", None)
+    if current is not None:
+        current[kind] += size
+
+def start_render_timer(sender, template, context, **extra):
+    start_phase("render")
+
+def end_render_timer(sender, template, context, **extra):
+    end_phase()
+
+before_render_template.connect(start_render_timer, app)
+template_rendered.connect(end_render_timer, app)
+
+@app.before_request
+def start_request_timer():
+    current = {
+        "started": time.perf_counter(),
+        "stack": [],
+        "phases": {"load": 0.0, "save": 0.0, "render": 0.0},
+        "read": 0,
+        "written": 0,
+        "profile": None,
+    }
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE \
+            and _profile_lock.acquire(blocking=False):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            current["profile"] = profile
+        except ValueError:
+            _profile_lock.release()     # some other profiler is running
+    _request_timer.current = current
+
+def stop_profile(current):
+    profile = current["profile"]
+    if profile:
+        current["profile"] = None
+        profile.disable()
+        _profile_lock.release()
+    return profile
+
+@app.after_request
+def finish_request_timer(response):
+    current = getattr(_request_timer, "current", None)
+    if current is None:
+        return response
+    _request_timer.current = None
+    profile = stop_profile(current)
+
+    total = time.perf_counter() - current["started"]
+    phases = dict(current["phases"], compute=max(0.0, total - sum(current["phases"].values())))
+    route = request.url_rule.rule if request.url_rule else "(no route)"
+    entry = {
+        "at": time.time(),
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "status": response.status_code,
+        "total_ms": total * 1000,
+        "read": current["read"],
+        "written": current["written"],
+    }
+    for phase, seconds in phases.items():
+        entry[phase + "_ms"] = seconds * 1000
+    response.headers["Server-Timing"] = ", ".join(
+        f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in phases.items())
+
+    with _request_stats_lock:
+        stats = request_stats.get(route)
+        if stats is None:
+            stats = request_stats[route] = {
+                "count": 0, "total": 0.0, "max": 0.0, "read": 0, "written": 0,
+                "phases": {phase: 0.0 for phase in phases},
+                "samples": deque(maxlen=ROUTE_SAMPLES),
+                "buckets": [0] * (len(LATENCY_BUCKETS) + 1),    # the last one is +Inf
+                "statuses": {},
+            }
+        stats["count"] += 1
+        stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS, total)] += 1
+        status = str(response.status_code)
+        stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+        stats["total"] += total
+        stats["max"] = max(stats["max"], total)
+        stats["read"] += current["read"]
+        stats["written"] += current["written"]
+        for phase, seconds in phases.items():
+            stats["phases"][phase] += seconds
+        stats["samples"].append(total)
+        recent_requests.append(entry)
+
+    if profile:
+        keep_profile(entry, profile)
+    save_worker_metrics()
+    return response
+
+@app.teardown_request
+def clear_request_timer(exc=None):
+    # after_request doesn't run if the response couldn't be built
+    current = getattr(_request_timer, "current", None)
+    if current:
+        stop_profile(current)
+    _request_timer.current = None
+
+def keep_profile(entry, profile):
+    with _request_stats_lock:
+        if len(slow_profiles) >= PROFILES_KEPT and entry["total_ms"] <= slow_profiles[-1]["total_ms"]:
+            return
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).strip_dirs().sort_stats("cumulative").print_stats(30)
+    with _request_stats_lock:
+        slow_profiles.append(dict(entry, profile=out.getvalue()))
+        slow_profiles.sort(key=lambda p: p["total_ms"], reverse=True)
+        del slow_profiles[PROFILES_KEPT:]
+
+def request_stats_summary():
+    """Per-route averages (ms, bytes), busiest routes first."""
+    rows = []
+    with _request_stats_lock:
+        for route, stats in request_stats.items():
+            count = stats["count"]
+            samples = sorted(stats["samples"])
+            row = {
+                "route": route,
+                "count": count,
+                "avg_ms": stats["total"] / count * 1000,
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+                "max_ms": stats["max"] * 1000,
+                "read": stats["read"] // count,
+                "written": stats["written"] // count,
+            }
+            for phase, seconds in stats["phases"].items():
+                row[phase + "_ms"] = seconds / count * 1000
+            rows.append(row)
+    rows.sort(key=lambda row: row["avg_ms"] * row["count"], reverse=True)
+    return rows
+
+
+# -----------------------------
+# Prometheus metrics
+# -----------------------------
+# /metrics in the Prometheus text format. Request and cache counters live
+# in each worker process, so every worker also saves its own to METRICS_DIR
+# (at most every METRICS_FLUSH_SECONDS) and whichever worker is scraped
+# adds them all up. Files of workers that are gone are deleted when
+# scraped, so the totals drop when a worker exits (Prometheus reads that
+# as a counter reset) instead of piling up across restarts. A new worker
+# that gets a still-listed pid carries on from that pid's file.
+
+METRICS_DIR = f"{DATA_DIR}/.metrics"
+METRICS_FLUSH_SECONDS = 5
+_worker_metrics = {"flushed_at": 0.0, "base": None}
+
+def add_counters(total, counters):
+    """Adds nested dicts (and bucket lists) of numbers from `counters` into `total`."""
+    for key, value in counters.items():
+        if isinstance(value, dict):
+            add_counters(total.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            current = total.setdefault(key, [0] * len(value))
+            if len(current) != len(value):
+                current[:] = [0] * len(value)   # bucket bounds changed
+            for i, count in enumerate(value):
+                current[i] += count
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+def worker_counters():
+    with _request_stats_lock:
+        routes = {
+            route: {"buckets": list(stats["buckets"]), "sum": stats["total"],
+                    "statuses": dict(stats["statuses"])}
+            for route, stats in request_stats.items()
+        }
+    with _snapshot_lock:
+        snapshot = dict(cache_stats)
+    with _page_cache_lock:
+        page = dict(page_cache_stats)
+    return {
+        "routes": routes,
+        "pushes": push_stats["pushes"],
+        "failed_pushes": push_stats["failed_pushes"],
+        "cache": {"snapshot": snapshot, "page": page},
+    }
+
+def save_worker_metrics(force=False):
+    now = time.time()
+    if not force and now - _worker_metrics["flushed_at"] < METRICS_FLUSH_SECONDS:
+        return
+    _worker_metrics["flushed_at"] = now
+    path = f"{METRICS_DIR}/{os.getpid()}.json"
+    try:
+        if _worker_metrics["base"] is None:
+            try:
+                _worker_metrics["base"] = read_json(path)["counters"]
+            except (OSError, ValueError, KeyError):
+                _worker_metrics["base"] = {}
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        write_json_atomic(path, {
+            "pid": os.getpid(),
+            "updated": now,
+            "counters": add_counters(copy.deepcopy(_worker_metrics["base"]), worker_counters()),
+            "gauges": {"push_queue": len(push_queue), "push_failures": push_stats["failures"]},
+        }, indent=None)
+    except OSError as e:
+        print(f"Couldn't save worker metrics: {e}")
+
+def save_metrics_at_exit():
+    if request_stats:   # scripts that import app serve no requests
+        save_worker_metrics(force=True)
+
+atexit.register(save_metrics_at_exit)
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def collect_metrics():
+    """(counters summed over the running workers, their gauges). Prunes the
+    files of workers that are no longer alive."""
+    save_worker_metrics(force=True)
+    counters = {}
+    gauges = []
+    for path in glob.glob(f"{glob.escape(METRICS_DIR)}/*.json"):
+        try:
+            data = read_json(path)
+        except (OSError, ValueError):
+            continue    # removed or replaced while listing
+        if not process_alive(data["pid"]):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass    # another worker pruned it first
+            continue
+        add_counters(counters, data["counters"])
+        gauges.append(data["gauges"])
+    return counters, gauges
+
+def data_file_sizes():
+    """Bytes on disk per data file (a journal counts all its segments)."""
+    files = [DATA_FILE, MOMS_HOUSE_FILE]
+    if STORAGE_BACKEND == "sqlite":
+        files += [SQLITE_FILE, SQLITE_FILE + "-wal"]
+    for journal, log_file in ((MATCH_LOG_JOURNAL, MATCH_LOG_FILE), (MOMS_HOUSE_LOG_JOURNAL, MOMS_HOUSE_LOG_FILE)):
+        files.append(journal if journal_segments(journal) else log_file)
+
+    sizes = {}
+    for path in files:
+        paths = journal_segments(path) if path.endswith(".jsonl") else [path]
+        existing = [p for p in paths if os.path.exists(p)]
+        if existing:
+            sizes[os.path.basename(path)] = sum(os.path.getsize(p) for p in existing)
+    return sizes
+
+def metric_labels(**labels):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+def render_metrics():
+    counters, gauges = collect_metrics()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{metric_labels(**labels) if labels else ''} {value}")
+
+    routes = counters.get("routes", {})
+    histogram = []
+    for route, stats in sorted(routes.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats["buckets"]):
+            cumulative += count
+            histogram.append(("_bucket", {"route": route, "le": bound}, cumulative))
+        histogram.append(("_sum", {"route": route}, round(stats["sum"], 6)))
+        histogram.append(("_count", {"route": route}, cumulative))
+    metric("elo_http_request_duration_seconds", "histogram", "Request latency by route.", histogram)
+    metric("elo_http_requests_total", "counter", "Requests by route and status code.", [
+        ("", {"route": route, "status": status}, count)
+        for route, stats in sorted(routes.items()) for status, count in sorted(stats["statuses"].items())
+    ])
+
+    metric("elo_push_queue_depth", "gauge", "Submissions waiting for the git sync.",
+           [("", None, sum(g["push_queue"] for g in gauges))])
+    metric("elo_push_consecutive_failures", "gauge", "Failed git syncs since the last success.",
+           [("", None, max([g["push_failures"] for g in gauges] or [0]))])
+    metric("elo_pushes_total", "counter", "Successful git pushes.", [("", None, counters.get("pushes", 0))])
+    metric("elo_push_failures_total", "counter", "Failed git sync attempts.",
+           [("", None, counters.get("failed_pushes", 0))])
+
+    metric("elo_cache_lookups_total", "counter", "Cache lookups by cache and result.", [
+        ("", {"cache": cache, "result": {"hits": "hit", "misses": "miss"}.get(result, result)}, count)
+        for cache, stats in sorted(counters.get("cache", {}).items()) for result, count in sorted(stats.items())
+    ])
+
+    metric("elo_data_file_bytes", "gauge", "Size of each data file on disk.", [
+        ("", {"file": name}, size) for name, size in sorted(data_file_sizes().items())
+    ])
+    metric("elo_players", "gauge", "Players with ratings.", [("", None, len(load_players()))])
+    metric("elo_matches", "gauge", "Matches in the match log.", [("", None, load_match_stats()["position"])])
+    metric("elo_moms_house_events", "gauge", "Mom's House results.", [("", None, load_moms_house_stats()["position"])])
+    metric("elo_workers", "gauge", "Worker processes reporting metrics.", [("", None, len(gauges))])
+
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Safe writes and locking
+# -----------------------------
+# Several gunicorn workers share the data files. Every save goes to a temp
+# file that is renamed over the original, so readers see the old or the
+# new file and never a half-written one. Read-modify-write sequences
+# (add_match, add_moms_house, ...) run under data_lock(), which is held
+# across processes with flock.
+
+DATA_LOCK_FILE = f"{DATA_DIR}/.data.lock"
+GIT_LOCK_FILE = f"{DATA_DIR}/.git_sync.lock"
+
+def read_json(path):
+    with timed("load"):
+        with open(path, "rb") as f:
+            data = f.read()
+        count_io("read", len(data))
+        return json.loads(data)
+
+def write_temp_file(path, write, mode="w"):
+    """Calls write(f) on a fsync'd temp file next to `path`; returns its name."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp_")
+    try:
+        os.chmod(tmp_path, 0o644)   # mkstemp defaults to 0600
+        with timed("save"), os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+            count_io("written", os.fstat(f.fileno()).st_size)
+    except:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+def write_json_atomic(path, data, indent=4):
+    tmp_path = write_temp_file(path, lambda f: json.dump(data, f, indent=indent))
+    os.replace(tmp_path, path)
+    invalidate_snapshot(path)
+
+_held_locks = threading.local()
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` shared across processes; re-entrant per thread."""
+    held = getattr(_held_locks, "files", None)
+    if held is None:
+        held = _held_locks.files = {}
+
+    if path in held:
+        held[path][0] += 1
+        try:
+            yield
+        finally:
+            held[path][0] -= 1
+        return
+
+    handle = open(path, "a")
+    try:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        held[path] = [1, handle]
+        yield
+    finally:
+        held.pop(path, None)
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+
+def data_lock():
+    return file_lock(DATA_LOCK_FILE)
+
+
+# -----------------------------
+# Shared read cache
+# -----------------------------
+# Parsed files are kept once per process and handed out to every request
+# until the file's stamp (mtime, size, inode) changes, either from our own
+# saves or from another worker. Snapshots are shared, so callers must not
+# mutate them in place.
+
+_snapshot_cache = {}   # key -> (stamp, data, extra)
+_snapshot_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+
+def file_stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamp.append((path, st.st_ino, st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+def cached_load(key, paths, loader):
+    """Returns the cached parse of `paths`, calling loader() only when they changed."""
+    stamp = file_stamp(paths)
+    with _snapshot_lock:
+        entry = _snapshot_cache.get(key)
+        if entry and entry[0] == stamp:
+            cache_stats["hits"] += 1
+            return entry[1]
+        cache_stats["misses"] += 1
+
+    data = loader()
+    with _snapshot_lock:
+        _snapshot_cache[key] = (stamp, data, None)
+    return data
+
+def invalidate_snapshot(key):
+    """Drops a cached file so the next load re-reads it (mtime can be coarse)."""
+    with _snapshot_lock:
+        _snapshot_cache.pop(key, None)
+
+
+# -----------------------------
+# Append-only journal
+# -----------------------------
+# Layout for a journal "match_log.jsonl":
+#   match_log.000001.jsonl, match_log.000002.jsonl, ...  (sealed, oldest first)
+#   match_log.jsonl                                      (active, appended to)
+
+def journal_segments(path):
+    """Returns the journal's files in replay order (sealed segments, then active)."""
+    base = path[:-len(".jsonl")]
+    segments = sorted(glob.glob(f"{glob.escape(base)}.[0-9]*.jsonl"))
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+@timed("load")
+def read_journal_segment(segment, offset=0):
+    """Parses records from `offset` on. Returns (records, offset consumed up to)."""
+    with open(segment, "rb") as f:
+        f.seek(offset)
+        chunk = f.read()
+    count_io("read", len(chunk))
+
+    lines = chunk.split(b"\n")
+    tail = lines.pop()
+    consumed = offset + len(chunk) - len(tail)
+
+    records = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # Torn line left behind by an interrupted append
+            print(f"Skipping unreadable journal line in {segment}")
+
+    # A last line without its newline is either mid-append or hand-edited
+    if tail.strip():
+        try:
+            records.append(json.loads(tail))
+            consumed += len(tail)
+        except ValueError:
+            pass
+
+    return records, consumed
+
+@timed("load")
+def read_journal_tail(path, count, block_size=65536):
+    """The journal's last `count` records (oldest first), read backward from the end."""
+    records = []
+    for segment in reversed(journal_segments(path)):
+        needed = count - len(records)
+        if needed <= 0:
+            break
+
+        blocks = []     # newest block first
+        found = 0
+        with open(segment, "rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            partial = b""
+            while position > 0 and found < needed:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                lines = (f.read(step) + partial).split(b"\n")
+                count_io("read", step)
+                # The first piece may start mid-record; keep it for the next block
+                partial = lines.pop(0) if position > 0 else b""
+
+                block = []
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        block.append(json.loads(line))
+                    except ValueError:
+                        pass            # torn line, see read_journal_segment
+                blocks.append(block)
+                found += len(block)
+
+        segment_records = [record for block in reversed(blocks) for record in block]
+        records = segment_records[-needed:] + records
+    return records
+
+def read_journal(path):
+    records = []
+    for segment in journal_segments(path):
+        records.extend(read_journal_segment(segment)[0])
+    return records
+
+def load_journal(path):
+    """Cached read_journal: when only the active file grew, parses just the new lines."""
+    segments = journal_segments(path)
+    stamp = file_stamp(segments)
+
+    with _snapshot_lock:
+        entry = _snapshot_cache.get(path)
+        if entry and entry[0] == stamp:
+            cache_stats["hits"] += 1
+            return entry[1]
+        cache_stats["misses"] += 1
+
+    grew = (
+        entry is not None and stamp and entry[0]
+        and stamp[-1][0] == path
+        and entry[0][:-1] == stamp[:-1]
+        and entry[0][-1][:2] == stamp[-1][:2]      # same active file
+        and entry[0][-1][2] <= stamp[-1][2]        # and it only got longer
+    )
+    if grew:
+        new_records, consumed = read_journal_segment(path, entry[2])
+        records = entry[1] + new_records
+    else:
+        records = []
+        consumed = 0
+        for segment in segments:
+            segment_records, consumed = read_journal_segment(segment)
+            records.extend(segment_records)
+
+    with _snapshot_lock:
+        _snapshot_cache[path] = (stamp, records, consumed)
+    return records
+
+def append_journal(path, *records):
+    """Appends the records in one fsync'd write."""
+    if JOURNAL_SEGMENT_BYTES and os.path.exists(path) \
+            and os.path.getsize(path) >= JOURNAL_SEGMENT_BYTES:
+        roll_journal(path)
+
+    line = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+    with timed("save"), open(path, "a+b") as f:
+        # Never glue a record onto a torn last line
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = b"\n" + line
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        count_io("written", len(line))
+
+def roll_journal(path):
+    """Seals the active journal file as the next numbered segment."""
+    sealed = journal_segments(path)
+    if sealed and sealed[-1] == path:
+        sealed.pop()
+    next_number = int(sealed[-1].rsplit(".", 2)[-2]) + 1 if sealed else 1
+    os.rename(path, f"{path[:-len('.jsonl')]}.{next_number:06d}.jsonl")
+
+def write_journal(path, records):
+    """Rewrites the journal as a single active file (rebuilds/migrations only)."""
+    def write(f):
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+    tmp_path = write_temp_file(path, write)
+    for segment in journal_segments(path):
+        if segment != path:
+            os.remove(segment)
+    os.replace(tmp_path, path)
+    invalidate_snapshot(path)
+
+
+# -----------------------------
+# SQLite backend
+# -----------------------------
+# With STORAGE_BACKEND=sqlite the load/save helpers above read and write
+# SQLITE_FILE instead of the JSON files. The database runs in WAL mode, so
+# readers never wait for the writer. Saves touch only the rows that changed,
+# and appends insert one row. Snapshots are cached per process like the
+# files are, keyed on a per-table version that every write bumps.
+# The JSON files remain the git-auditable copy: export_json() rewrites them
+# before each push. Convert existing data with migrate_to_sqlite.py.
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,        -- keeps characters.json's player order
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    id INTEGER PRIMARY KEY,        -- keeps each player's key order
+    player TEXT NOT NULL,
+    key TEXT NOT NULL,             -- a character, or "badges", "decay_through", ...
+    value TEXT NOT NULL,           -- JSON
+    UNIQUE (player, key)
+);
+CREATE INDEX IF NOT EXISTS ratings_key ON ratings (key);
+
+CREATE TABLE IF NOT EXISTS matches (
+    seq INTEGER PRIMARY KEY,       -- log position
+    timestamp TEXT,
+    p1 TEXT, c1 TEXT, p2 TEXT, c2 TEXT, winner TEXT,
+    data TEXT NOT NULL             -- the whole log entry as JSON
+);
+CREATE INDEX IF NOT EXISTS matches_p1 ON matches (p1, c1);
+CREATE INDEX IF NOT EXISTS matches_p2 ON matches (p2, c2);
+CREATE INDEX IF NOT EXISTS matches_c1 ON matches (c1);
+CREATE INDEX IF NOT EXISTS matches_c2 ON matches (c2);
+CREATE INDEX IF NOT EXISTS matches_timestamp ON matches (timestamp);
+
+CREATE TABLE IF NOT EXISTS moms_house (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL UNIQUE,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS moms_house_events (
+    seq INTEGER PRIMARY KEY,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS moms_house_events_timestamp ON moms_house_events (timestamp);
+
+CREATE TABLE IF NOT EXISTS documents (   -- last_result.json, moms_house_last_result.json
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,      -- bumped by every write
+    generation INTEGER NOT NULL    -- bumped by full rewrites only
+);
+"""
+
+_db_local = threading.local()
+
+def db_connect():
+    """This thread's connection, opened (and the schema created) on first use."""
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SQLITE_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SQLITE_SCHEMA)
+        _db_local.conn = conn
+    return conn
+
+@contextmanager
+def db_transaction(write=False):
+    conn = db_connect()
+    with timed("save" if write else "load"):
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def db_version(conn, table):
+    row = conn.execute(
+        "SELECT version, generation FROM table_versions WHERE name = ?", (table,)
+    ).fetchone()
+    return row or (0, 0)
+
+def db_bump(conn, table, rewrite=False):
+    conn.execute(
+        "INSERT INTO table_versions VALUES (?, 1, ?) ON CONFLICT (name) DO UPDATE "
+        "SET version = version + 1, generation = generation + excluded.generation",
+        (table, int(rewrite)),
+    )
+
+def db_cached_load(table, read):
+    """Cached read(conn, previous_entry) of a table; re-runs only after a write."""
+    key = f"sqlite:{table}"
+    version = db_version(db_connect(), table)
+    with _snapshot_lock:
+        entry = _snapshot_cache.get(key)
+        if entry and entry[0] == version:
+            cache_stats["hits"] += 1
+            return entry[1]
+        cache_stats["misses"] += 1
+
+    with db_transaction() as conn:
+        version = db_version(conn, table)
+        data, extra = read(conn, entry)
+
+    with _snapshot_lock:
+        _snapshot_cache[key] = (version, data, extra)
+    return data
+
+def db_load_players():
+    def read(conn, previous):
+        players = {name: {} for name, in conn.execute("SELECT name FROM players ORDER BY id")}
+        for player, key, value in conn.execute("SELECT player, key, value FROM ratings ORDER BY id"):
+            players[player][key] = json.loads(value)
+        return players, None
+    return db_cached_load("ratings", read)
+
+def db_load_moms_house():
+    def read(conn, previous):
+        rows = conn.execute("SELECT player, value FROM moms_house ORDER BY id")
+        return {player: json.loads(value) for player, value in rows}, None
+    return db_cached_load("moms_house", read)
+
+def db_save_players(players):
+    """Upserts the players that differ from the current snapshot.
+
+    Callers hold data_lock(), so the snapshot can't go stale in between.
+    """
+    old = db_load_players()
+    with db_transaction(write=True) as conn:
+        for name in old.keys() - players.keys():
+            conn.execute("DELETE FROM players WHERE name = ?", (name,))
+            conn.execute("DELETE FROM ratings WHERE player = ?", (name,))
+        for name, pdata in players.items():
+            if name not in old:
+                conn.execute("INSERT INTO players (name) VALUES (?)", (name,))
+            previous = old.get(name, {})
+            if previous == pdata:
+                continue
+            for key in previous.keys() - pdata.keys():
+                conn.execute("DELETE FROM ratings WHERE player = ? AND key = ?", (name, key))
+            conn.executemany(
+                "INSERT INTO ratings (player, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (player, key) DO UPDATE SET value = excluded.value",
+                [(name, key, json.dumps(value)) for key, value in pdata.items()
+                 if key not in previous or previous[key] != value],
+            )
+        db_bump(conn, "ratings")
+
+def db_save_moms_house(data):
+    old = db_load_moms_house()
+    with db_transaction(write=True) as conn:
+        for name in old.keys() - data.keys():
+            conn.execute("DELETE FROM moms_house WHERE player = ?", (name,))
+        conn.executemany(
+            "INSERT INTO moms_house (player, value) VALUES (?, ?) "
+            "ON CONFLICT (player) DO UPDATE SET value = excluded.value",
+            [(name, json.dumps(value)) for name, value in data.items()
+             if name not in old or old[name] != value],
+        )
+        db_bump(conn, "moms_house")
+
+def db_log_row(table, entry):
+    if table == "matches":
+        return (entry.get("timestamp"), entry.get("p1"), entry.get("c1"),
+                entry.get("p2"), entry.get("c2"), entry.get("winner"), json.dumps(entry))
+    return (entry.get("timestamp"), json.dumps(entry))
+
+def db_insert_log(conn, table, entries):
+    columns = "timestamp, p1, c1, p2, c2, winner, data" if table == "matches" else "timestamp, data"
+    placeholders = ", ".join("?" * len(columns.split(", ")))
+    conn.executemany(
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+        [db_log_row(table, entry) for entry in entries],
+    )
+
+def db_load_log(table):
+    """Like load_journal: after appends, only the new rows are fetched."""
+    def read(conn, previous):
+        version = db_version(conn, table)
+        if previous and previous[0][1] == version[1]:
+            records, last_seq = previous[1], previous[2]
+        else:
+            records, last_seq = [], 0
+
+        rows = conn.execute(f"SELECT seq, data FROM {table} WHERE seq > ? ORDER BY seq", (last_seq,))
+        new_records = []
+        for seq, data in rows:
+            new_records.append(json.loads(data))
+            last_seq = seq
+        return records + new_records, last_seq
+    return db_cached_load(table, read)
+
+def db_read_log_tail(table, count):
+    with timed("load"):
+        rows = db_connect().execute(f"SELECT data FROM {table} ORDER BY seq DESC LIMIT ?", (count,))
+        return [json.loads(data) for data, in rows][::-1]
+
+def db_append_log(table, *entries):
+    with db_transaction(write=True) as conn:
+        db_insert_log(conn, table, entries)
+        db_bump(conn, table)
+
+def db_write_log(table, log):
+    with db_transaction(write=True) as conn:
+        conn.execute(f"DELETE FROM {table}")
+        db_insert_log(conn, table, log)
+        db_bump(conn, table, rewrite=True)
+
+def db_load_document(name):
+    with timed("load"):
+        row = db_connect().execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+def db_save_document(name, data):
+    with db_transaction(write=True) as conn:
+        conn.execute(
+            "INSERT INTO documents VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET data = excluded.data",
+            (name, json.dumps(data)),
+        )
+
+def db_reset():
+    """The /reset route: drop the ratings, match log and last result."""
+    with db_transaction(write=True) as conn:
+        conn.execute("DELETE FROM players")
+        conn.execute("DELETE FROM ratings")
+        conn.execute("DELETE FROM matches")
+        conn.execute("DELETE FROM documents WHERE name = 'last_result'")
+        db_bump(conn, "ratings", rewrite=True)
+        db_bump(conn, "matches", rewrite=True)
+
+def export_log(records, journal, write_all):
+    """Brings a JSON log up to date, appending when it is a prefix of `records`."""
+    if journal_segments(journal):
+        existing = load_journal(journal)
+        if len(existing) <= len(records) and existing == records[:len(existing)]:
+            if len(records) > len(existing):
+                append_journal(journal, *records[len(existing):])
+            return
+    write_all(records)
+
+def export_json():
+    """Rewrites the JSON files from the database (the copy git tracks)."""
+    # Same lock as the push worker, so two exports never append twice
+    with file_lock(GIT_LOCK_FILE):
+        with data_lock():
+            players = db_load_players()
+            last_result = db_load_document("last_result")
+            match_log = db_load_log("matches")
+            moms_house = db_load_moms_house()
+            moms_house_log = db_load_log("moms_house_events")
+            moms_house_last = db_load_document("moms_house_last_result")
+
+        write_json_atomic(DATA_FILE, players)
+        if last_result:
+            write_json_atomic(LAST_RESULT_FILE, last_result)
+        export_log(match_log, MATCH_LOG_JOURNAL, _write_match_log)
+        if moms_house:
+            write_json_atomic(MOMS_HOUSE_FILE, moms_house)
+        if moms_house_log:
+            export_log(moms_house_log, MOMS_HOUSE_LOG_JOURNAL, _write_moms_house_log)
+        if moms_house_last:
+            write_json_atomic(MOMS_HOUSE_LAST_FILE, moms_house_last)
+
+
+# -----------------------------
+# Stats index
+# -----------------------------
+# Running per-player records folded in one log entry at a time. Each index
+# remembers how many log entries it covers ("position"), so an append only
+# applies the new tail and a missing or outdated index is rebuilt in a
+# single pass over the log.
+#
+# Every process keeps its index in memory and folds new entries into it in
+# place. The file is only a snapshot for the next process to start from:
+# it is rewritten when STATS_INDEX_SAVE_EVERY entries have been added since
+# it was written (the log itself is the delta between snapshots). Readers
+# in other threads hold the same dicts, so a dict only ever gains a key by
+# being replaced with a copy that has it (see subrecord).
+
+# Bump when the index layout changes so old files get rebuilt
+STATS_INDEX_VERSION = 4
+STATS_INDEX_SAVE_EVERY = int(os.getenv("STATS_INDEX_SAVE_EVERY", "1000"))
+
+_stats_indexes = {}     # path -> {"stamp": file stamp, "index": ..., "saved": position on disk}
+_stats_index_lock = threading.Lock()
+
+def empty_stats_index():
+    return {"version": STATS_INDEX_VERSION, "position": 0, "players": {}}
+
+def subrecord(parent, field, key, new):
+    """parent[field][key], set to `new` first if it's missing. parent[field]
+    is replaced with a copy that has the key rather than mutated, since a
+    reader may be iterating it."""
+    value = parent[field].get(key)
+    if value is None:
+        value = new
+        updated = dict(parent[field])
+        updated[key] = value
+        parent[field] = updated
+    return value
+
+def player_record(index, name):
+    return subrecord(index, "players", name, {
+        "matches": 0,
+        "streak": 0,
+        "best_streak": 0,
+        "wins": 0,
+        "losses": 0,
+        "three_stocks": 0,       # three-stocks dealt
+        "three_stocked": 0,      # three-stocks taken
+        "first_match": None,
+        "last_match": None,
+        "characters": {},
+        "opponents": {},         # head-to-head, see record_head_to_head
+    })
+
+def character_record(record, char):
+    return subrecord(record, "characters", char, {
+        "matches": 0,
+        "wins": 0,
+        "losses": 0,
+        "three_stocks": 0,
+    })
+
+def match_time(entry):
+    """The entry's timestamp, or None for legacy "N/A" entries."""
+    ts = entry.get("timestamp")
+    return ts if ts and ts != "N/A" else None
+
+def record_played(record, timestamp):
+    record["matches"] += 1
+    if timestamp:
+        record["first_match"] = record["first_match"] or timestamp
+        record["last_match"] = timestamp
+
+def record_win(record, timestamp):
+    record_played(record, timestamp)
+    record["wins"] += 1
+    record["streak"] += 1
+    record["best_streak"] = max(record["best_streak"], record["streak"])
+
+def record_loss(record, timestamp):
+    record_played(record, timestamp)
+    record["losses"] += 1
+    record["streak"] = 0
+
+def win_rate(record):
+    total = record["wins"] + record["losses"]
+    return round((record["wins"] / total) * 100, 1) if total > 0 else 0
+
+def record_head_to_head(record, opponent, my_char, opp_char, won):
+    """opponents[opponent] holds wins/losses plus a my_char -> opp_char breakdown."""
+    h2h = subrecord(record, "opponents", opponent, {
+        "wins": 0,
+        "losses": 0,
+        "characters": {},
+    })
+    subrecord(h2h, "characters", my_char, {})
+    pairing = subrecord(h2h["characters"], my_char, opp_char, {
+        "wins": 0,
+        "losses": 0,
+    })
+    key = "wins" if won else "losses"
+    h2h[key] += 1
+    pairing[key] += 1
+
+def matchup_summary(h2h):
+    """The /api/matchup payload for one head-to-head entry (or None)."""
+    wins = h2h["wins"] if h2h else 0
+    losses = h2h["losses"] if h2h else 0
+    return {
+        "total": wins + losses,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": win_rate({"wins": wins, "losses": losses}),
+    }
+
+def index_match(index, m):
+    timestamp = match_time(m)
+    three_stock = bool(m.get("three_stock"))
+
+    # Winner first, then loser (matches the old streak replay order)
+    win_side = m["winner"]
+    lose_side = "p2" if win_side == "p1" else "p1"
+
+    if m["p1"] == m["p2"]:
+        index_self_match(index, m, win_side, lose_side, timestamp, three_stock)
+        return
+
+    winner = player_record(index, m[win_side])
+    record_win(winner, timestamp)
+    winner_char = character_record(winner, m["c" + win_side[1]])
+    winner_char["matches"] += 1
+    winner_char["wins"] += 1
+
+    loser = player_record(index, m[lose_side])
+    record_loss(loser, timestamp)
+    loser_char = character_record(loser, m["c" + lose_side[1]])
+    loser_char["matches"] += 1
+    loser_char["losses"] += 1
+
+    if three_stock:
+        winner["three_stocks"] += 1
+        winner_char["three_stocks"] += 1
+        loser["three_stocked"] += 1
+
+    win_char, lose_char = m["c" + win_side[1]], m["c" + lose_side[1]]
+    record_head_to_head(winner, m[lose_side], win_char, lose_char, True)
+    record_head_to_head(loser, m[win_side], lose_char, win_char, False)
+
+def index_self_match(index, m, win_side, lose_side, timestamp, three_stock):
+    """A match against yourself counts once, as a win (like the old per-page
+    scans), and still ends the streak (the old streak replay reset the
+    "loser" after crediting the winner)."""
+    record = player_record(index, m[win_side])
+    record_played(record, timestamp)
+    record["wins"] += 1
+    record["streak"] = 0
+    char = character_record(record, m["c" + win_side[1]])
+    char["matches"] += 1
+    char["wins"] += 1
+    if three_stock:
+        record["three_stocks"] += 1
+        char["three_stocks"] += 1
+    record_head_to_head(record, m[win_side], m["c" + win_side[1]], m["c" + lose_side[1]], True)
+
+def index_moms_house_event(index, entry):
+    placements = entry.get("placements", [])
+    if not placements:
+        return
+    timestamp = entry.get("timestamp")
+
+    # Only first place counts as a win
+    record_win(player_record(index, placements[0]), timestamp)
+    for loser in placements[1:]:
+        record_loss(player_record(index, loser), timestamp)
+
+def read_stats_index(path):
+    """(file stamp, stored index or None when missing, unreadable or outdated)."""
+    stamp = file_stamp([path])
+    try:
+        index = read_json(path)
+    except (OSError, ValueError):
+        return stamp, None
+    if not isinstance(index, dict) or index.get("version") != STATS_INDEX_VERSION:
+        return stamp, None
+    return stamp, index
+
+def current_stats_index(path, log_stamp):
+    """This process's index for `path` if it's still current, else None.
+    Call with _stats_index_lock held."""
+    state = _stats_indexes.get(path)
+    if state is None or state["stamp"] != file_stamp([path]):
+        stamp, index = read_stats_index(path)
+        state = _stats_indexes[path] = {
+            "stamp": stamp,
+            "index": index or empty_stats_index(),
+            "saved": index["position"] if index else None,
+        }
+    return state["index"] if state["index"].get("log_stamp") == log_stamp else None
+
+def load_stats_index(path, read_log, index_entry, log_stamp):
+    """Returns the index for `path`, caught up to the end of the log.
+
+    read_log(start) returns (log length, the entries from `start` on). The
+    index remembers the log's stamp from its last catch-up; while the stamp
+    is unchanged, read_log() isn't called at all. The in-memory index is
+    dropped when the file changes under it (another worker saved a newer
+    snapshot, or the log was rewritten and the index reset). Catching up
+    holds data_lock(), so it never interleaves with a reset or a save.
+    """
+    with _stats_index_lock:
+        index = current_stats_index(path, log_stamp)
+    if index is not None:
+        return index
+
+    with data_lock(), _stats_index_lock:
+        index = current_stats_index(path, log_stamp)
+        if index is not None:
+            return index
+        state = _stats_indexes[path]
+        index = state["index"]
+
+        length, entries = read_log(index["position"])
+        if index["position"] > length:
+            index = state["index"] = empty_stats_index()
+            state["saved"] = None
+            length, entries = read_log(0)
+
+        for entry in entries:
+            index_entry(index, entry)
+            index["position"] += 1
+        index["log_stamp"] = log_stamp
+
+        if state["saved"] is None or index["position"] - state["saved"] >= STATS_INDEX_SAVE_EVERY:
+            save_stats_index(path, state)
+        return index
+
+def save_stats_index(path, state):
+    write_json_atomic(path, state["index"], indent=None)
+    state["stamp"] = file_stamp([path])
+    state["saved"] = state["index"]["position"]
+
+def reset_stats_index(path):
+    with data_lock(), _stats_index_lock:
+        if os.path.exists(path):
+            os.remove(path)
+        _stats_indexes.pop(path, None)
+
+def match_entries(start):
+    table = match_table()
+    length = table["length"]
+    return length, (match_row(table, index) for index in range(start, length))
+
+def moms_house_entries(start):
+    log = load_moms_house_log()
+    return len(log), log[start:]
+
+def load_match_stats():
+    return load_stats_index(MATCH_STATS_FILE, match_entries, index_match, match_log_stamp())
+
+def load_moms_house_stats():
+    return load_stats_index(MOMS_HOUSE_STATS_FILE, moms_house_entries, index_moms_house_event,
+                            moms_house_log_stamp())
+
+def current_streaks(index):
+    return {name: record["streak"] for name, record in index["players"].items()}
 
 
 # -----------------------------
@@ -332,20 +1881,1063 @@ def calculate_elo_custom(
     return max(1000, new_p1), max(1000, new_p2)
 
 
+MOMS_HOUSE_MAX_ENTRANTS = 128
+MOMS_HOUSE_MATRIX_MIN = 16     # entrants from which the NumPy path is faster
+
 def calculate_moms_house_deltas(placements, ratings):
     """Pairwise multiplayer Elo: higher placement beats lower placement."""
-    deltas = {name: 0 for name in placements}
-    for i, winner in enumerate(placements):
-        for loser in placements[i + 1:]:
-            r_w = ratings[winner]
-            r_l = ratings[loser]
-            expected_w = 1 / (1 + 10 ** ((r_l - r_w) / 400))
+    r = [ratings[name] for name in placements]
+    if numpy is not None and len(r) >= MOMS_HOUSE_MATRIX_MIN and all(isinstance(x, int) for x in r):
+        return dict(zip(placements, moms_house_deltas_matrix(r)))
+
+    deltas = [0] * len(r)
+    for i, r_w in enumerate(r):
+        for j in range(i + 1, len(r)):
+            expected_w = 1 / (1 + 10 ** ((r[j] - r_w) / 400))
             change = MOMS_HOUSE_K * (1 - expected_w)
-            deltas[winner] += change
-            deltas[loser] -= change
-    return deltas
+            deltas[i] += change
+            deltas[j] -= change
+    return dict(zip(placements, deltas))
+
+_elo_powers = {"table": (0, None)}     # (span, array of 10 ** (d / 400) for d in -span..span)
+
+def elo_powers(span):
+    """Lookup array for rating differences up to `span`, from Python's own
+    pow (NumPy's can differ in the last bit). Grown as needed."""
+    current, table = _elo_powers["table"]
+    if table is None or span > current:
+        current = max(span, 2 * current, 1000)
+        table = numpy.array([10 ** (d / 400) for d in range(-current, current + 1)])
+        _elo_powers["table"] = (current, table)
+    return current, table
+
+def moms_house_deltas_matrix(r):
+    """The pairwise loop as matrix operations (ratings in placement order).
+
+    change[i, j] is what i takes from j when placed above. Each player's
+    row is summed left to right like the loop (losses to everyone above,
+    then wins over everyone below), so the floats come out the same.
+    """
+    rating = numpy.array(r, dtype=numpy.int64)
+    differences = rating[None, :] - rating[:, None]
+    span, powers = elo_powers(int(rating.max() - rating.min()))
+    expected = 1 / (1 + powers[differences + span])
+    change = MOMS_HOUSE_K * (1 - expected)
+    rows = numpy.triu(change, 1) - numpy.tril(change.T, -1)
+    return numpy.cumsum(rows, axis=1)[:, -1].tolist()
+
+def rate_moms_house_event(ratings, placements):
+    """Applies one result to `ratings` in place: newcomers start at 1000 and
+    nobody drops below 1000. Returns (before, after, applied deltas)."""
+    for name in placements:
+        ratings.setdefault(name, 1000)
+    before = {name: ratings[name] for name in placements}
+    deltas = calculate_moms_house_deltas(placements, before)
+    for name in placements:
+        ratings[name] = max(1000, round(before[name] + deltas[name]))
+    after = {name: ratings[name] for name in placements}
+    # After the floor, so losses never take anyone under 1000
+    return before, after, {name: after[name] - before[name] for name in placements}
+
+def replay_moms_house(log, ratings=None):
+    """Re-rates every Mom's House event from its placements alone, in the
+    given order, starting from `ratings` (default: everyone at 1000).
+
+    Returns (ratings, events) where events[i] is log[i] with fresh
+    "before", "after" and "delta".
+    """
+    ratings = dict(ratings or {})
+    events = []
+    for entry in log:
+        before, after, delta = rate_moms_house_event(ratings, entry["placements"])
+        events.append(dict(entry, before=before, after=after, delta=delta))
+    return ratings, events
+
+
+
+
+# -----------------------------
+# Replay engine
+# -----------------------------
+# Full-history ELO replays (rebuild_match_log.py and friends). Names are
+# interned to small ints, ratings live in one flat int array indexed by
+# player * n_chars + character, each player's global offset is a running
+# sum, and timestamps are parsed once up front. Results are the same as
+# calling calculate_elo_custom with compute_global_elo on nested dicts.
+
+def parse_match_time(ts):
+    """Same result as strptime with "%Y-%m-%d %I:%M %p", then "%Y-%m-%d %H:%M".
+
+    Returns None when neither format matches. The common fixed-width forms
+    are parsed by slicing, which is much cheaper than strptime.
+    """
+    if not isinstance(ts, str):
+        return None
+    try:
+        if len(ts) == 19 and ts[4] == "-" and ts[7] == "-" and ts[10] == " " \
+                and ts[13] == ":" and ts[16] == " " and ts[11:13].isdigit():
+            hour = int(ts[11:13])
+            meridiem = ts[17:].upper()
+            if 1 <= hour <= 12 and meridiem in ("AM", "PM") and ts[14:16].isdigit() \
+                    and ts[:4].isdigit() and ts[5:7].isdigit() and ts[8:10].isdigit():
+                hour = hour % 12 + (12 if meridiem == "PM" else 0)
+                return datetime(int(ts[:4]), int(ts[5:7]), int(ts[8:10]), hour, int(ts[14:16]))
+        if len(ts) == 16 and ts[4] == "-" and ts[7] == "-" and ts[10] == " " \
+                and ts[13] == ":" and ts[:4].isdigit() and ts[5:7].isdigit() \
+                and ts[8:10].isdigit() and ts[11:13].isdigit() and ts[14:16].isdigit():
+            return datetime(int(ts[:4]), int(ts[5:7]), int(ts[8:10]), int(ts[11:13]), int(ts[14:16]))
+    except ValueError:
+        return None
+
+    # Anything unusual (single-digit fields, odd spacing) goes through strptime
+    for fmt in ("%Y-%m-%d %I:%M %p", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(ts, fmt)
+        except ValueError:
+            pass
+    return None
+
+def match_time_keys(log, start=0):
+    """Sort keys (minutes since year 1) for log[start:], parsed once.
+
+    Entries without a parseable timestamp get the same synthetic time
+    rebuild_match_log.py always used (2000-01-01, hour/minute from the
+    index). Returns (keys, unparsed) where unparsed is the set of those
+    indexes.
+    """
+    keys = []
+    unparsed = set()
+    memo = {}
+    for index in range(start, len(log)):
+        key = entry_time_key(log[index], memo)
+        if key is None:
+            unparsed.add(index)
+            key = synthetic_time_key(index)
+        keys.append(key)
+    return keys, unparsed
+
+def entry_time_key(m, memo):
+    """One entry's sort key, or None without a usable time. `memo` caches parses."""
+    # Normalized entries carry an ISO "time"; its local part is read by slicing
+    iso = m.get("time")
+    ts = iso or m.get("timestamp", "")
+    key = memo.get(ts)
+    if key is None:
+        if iso:
+            parsed = datetime(int(iso[:4]), int(iso[5:7]), int(iso[8:10]),
+                              int(iso[11:13]), int(iso[14:16]))
+        else:
+            parsed = parse_match_time(ts)
+        if parsed is not None:
+            key = time_key(parsed)
+            memo[ts] = key
+    return key
+
+def synthetic_time_key(index):
+    return 730120 * 1440 + ((index // 60) % 24) * 60 + index % 60   # 2000-01-01
+
+def time_key(when):
+    return when.toordinal() * 1440 + when.hour * 60 + when.minute
+
+def chronological_order(log):
+    """Replay order for `log` (a stable sort by timestamp) and the unparsed indexes."""
+    keys, unparsed = match_time_keys(log)
+    order = sorted(range(len(log)), key=keys.__getitem__)
+    return order, unparsed
+
+MATCH_TIMEZONE = ZoneInfo("America/New_York")
+
+def canonical_match_time(entry):
+    """ISO 8601 time (with UTC offset) for the entry's timestamp; None for "N/A"."""
+    parsed = parse_match_time(entry.get("timestamp"))
+    if parsed is None:
+        return None
+    return parsed.replace(tzinfo=MATCH_TIMEZONE).isoformat()
+
+def normalize_match(entry, seq):
+    """Adds the log sequence number and the canonical "time" to an entry."""
+    entry["seq"] = seq
+    if "time" not in entry:
+        entry["time"] = canonical_match_time(entry)
+
+def sorted_prefix_length(order):
+    """How many leading log entries are already in replay order."""
+    for position, index in enumerate(order):
+        if position != index:
+            return position
+    return len(order)
+
+def intern(ids, names, name):
+    """Small-int id for `name`, assigning the next one on first sight."""
+    id_ = ids.get(name)
+    if id_ is None:
+        id_ = ids[name] = len(names)
+        names.append(name)
+    return id_
+
+def replay_columns(start):
+    """Empty replay input; known characters keep their CHARACTERS position."""
+    columns = {
+        "player_ids": {},
+        "player_names": [],
+        "char_ids": {c: i for i, c in enumerate(CHARACTERS)},
+        "char_names": list(CHARACTERS),
+        "p1": array("i"), "c1": array("i"), "p2": array("i"), "c2": array("i"),
+        "p1_won": bytearray(),
+    }
+    for name, char_map in (start["ratings"] if start else {}).items():
+        intern(columns["player_ids"], columns["player_names"], name)
+        for char in char_map:
+            intern(columns["char_ids"], columns["char_names"], char)
+    return columns
+
+def replay_ratings(log, order=None, start=None, progress=None, checkpoint=None):
+    """Replays log entries with calculate_elo_custom.
+
+    `order` lists the log indexes to apply (default: all, in log order),
+    starting from empty ratings or from a `start` checkpoint. Returns
+    (players, results): players is the rebuilt {player: {char: rating}}
+    map (same key order as a dict-based replay), and results[i] is
+    (new1, diff1, new2, diff2) for each replayed log[i].
+
+    `progress(done, total)` is called every 50,000 matches, and
+    `checkpoint(done, players, offsets)` every CHECKPOINT_EVERY matches
+    (`done` counts from the start of the log, including `start`).
+    """
+    if order is None:
+        order = range(len(log))
+
+    columns = replay_columns(start)
+    player_ids, player_names = columns["player_ids"], columns["player_names"]
+    char_ids, char_names = columns["char_ids"], columns["char_names"]
+    for index in order:
+        m = log[index]
+        columns["p1"].append(intern(player_ids, player_names, m["p1"]))
+        columns["c1"].append(intern(char_ids, char_names, m["c1"]))
+        columns["p2"].append(intern(player_ids, player_names, m["p2"]))
+        columns["c2"].append(intern(char_ids, char_names, m["c2"]))
+        columns["p1_won"].append(m["winner"] == "p1")
+
+    return replay(columns, order, len(log), start, progress, checkpoint)
+
+def replay_table(table, order, start=None):
+    """replay_ratings for positions of a match_table()."""
+    columns = replay_columns(start)
+    players = [intern(columns["player_ids"], columns["player_names"], name)
+               for name in table["player_names"]]
+    chars = [intern(columns["char_ids"], columns["char_names"], char)
+             for char in table["char_names"]]
+    p1, c1, p2, c2, p1_won = (table[name] for name in ("p1", "c1", "p2", "c2", "p1_won"))
+    for index in order:
+        columns["p1"].append(players[p1[index]])
+        columns["c1"].append(chars[c1[index]])
+        columns["p2"].append(players[p2[index]])
+        columns["c2"].append(chars[c2[index]])
+        columns["p1_won"].append(p1_won[index])
+
+    return replay(columns, order, table["length"], start)
+
+def logged_ratings(table, order, start=None):
+    """The ratings the log recorded, on top of a `start` checkpoint: each
+    (player, character) keeps the new1/new2 of the last position in `order`
+    that rated it. Unlike a replay, this is what characters.json held at
+    the time, resets and hand edits included."""
+    players = {name: dict(chars) for name, chars in (start["ratings"] if start else {}).items()}
+    names, chars = table["player_names"], table["char_names"]
+    for index in order:
+        for p, c, new in (("p1", "c1", "new1"), ("p2", "c2", "new2")):
+            value = table[new][index]
+            if value != MISSING:
+                players.setdefault(names[table[p][index]], {})[chars[table[c][index]]] = value
+    return players
+
+def replay(columns, order, length, start=None, progress=None, checkpoint=None):
+    """The replay loop over interned columns (one row per `order` step)."""
+    player_ids, player_names = columns["player_ids"], columns["player_names"]
+    char_ids, char_names = columns["char_ids"], columns["char_names"]
+    p1s, c1s, p2s, c2s = columns["p1"], columns["c1"], columns["p2"], columns["c2"]
+    p1_won = columns["p1_won"]
+    start_ratings = start["ratings"] if start else {}
+
+    n_chars = len(char_names)
+    ratings = array("i", [1000]) * (len(player_names) * n_chars)
+    offsets = [0] * len(player_names)
+
+    # First-seen order, so the rebuilt dict serializes like the old replay
+    seen = bytearray(len(ratings))
+    player_seen = bytearray(len(player_names))
+    player_order = []
+    char_order = [[] for _ in player_names]
+
+    for name, char_map in start_ratings.items():
+        pid = player_ids[name]
+        player_seen[pid] = 1
+        player_order.append(pid)
+        for char, rating in char_map.items():
+            cid = char_ids[char]
+            ratings[pid * n_chars + cid] = rating
+            seen[pid * n_chars + cid] = 1
+            char_order[pid].append(cid)
+        offsets[pid] = start["offsets"][name]
+
+    def export():
+        players = {}
+        for pid in player_order:
+            base = pid * n_chars
+            players[player_names[pid]] = {
+                char_names[cid]: ratings[base + cid] for cid in char_order[pid]
+            }
+        return players, {player_names[pid]: offsets[pid] for pid in player_order}
+
+    results = [None] * length
+    first = start["position"] if start else 0
+    total = first + len(p1s)
+    for step, index in enumerate(order):
+        p1, p2 = p1s[step], p2s[step]
+        k1 = p1 * n_chars + c1s[step]
+        k2 = p2 * n_chars + c2s[step]
+
+        for pid, key in ((p1, k1), (p2, k2)):
+            if not player_seen[pid]:
+                player_seen[pid] = 1
+                player_order.append(pid)
+            if not seen[key]:
+                seen[key] = 1
+                char_order[pid].append(key - pid * n_chars)
+
+        old1 = ratings[k1]
+        old2 = ratings[k2]
+        new1, new2 = calculate_elo_custom(
+            old1, old2,
+            offsets[p1], offsets[p2],
+            "p1" if p1_won[step] else "p2"
+        )
+
+        ratings[k1] = new1
+        offsets[p1] += new1 - old1
+        # Re-read in case both sides are the same player and character
+        prev2 = ratings[k2]
+        ratings[k2] = new2
+        offsets[p2] += new2 - prev2
+
+        results[index] = (new1, new1 - old1, new2, new2 - old2)
+
+        done = first + step + 1
+        if progress and done % 50000 == 0:
+            progress(done, total)
+        if checkpoint and CHECKPOINT_EVERY and done % CHECKPOINT_EVERY == 0:
+            checkpoint(done, *export())
+
+    return export()[0], results
+
+
+# -----------------------------
+# Compact match table
+# -----------------------------
+# What the running app keeps of the match log: one typed array per field,
+# with players and characters interned to small ints (characters keep
+# their CHARACTERS position), about 50 bytes per match instead of ~1.7 KB
+# of dicts. It is read straight from storage without holding on to the
+# parsed entries, extended in place when the log only grew, and feeds the
+# stats index, checkpoints and "as of" replays. Scripts that rewrite the
+# log still work on load_match_log().
+
+MISSING = -2 ** 31      # int column value for a field an entry doesn't have
+TABLE_TAIL = 64         # latest raw entries kept (recent_match_entries)
+
+_match_table = {"stamp": None, "table": None}
+_match_table_lock = threading.Lock()
+
+def empty_match_table():
+    table = {
+        "length": 0,
+        "player_ids": {},
+        "player_names": [],
+        "char_ids": {c: i for i, c in enumerate(CHARACTERS)},
+        "char_names": list(CHARACTERS),
+        "keys": array("q"),         # time_key, as in match_time_keys
+        "unparsed": set(),
+        "timestamps": {},           # index -> timestamp, where it isn't format_time_key(key)
+        "p1_won": bytearray(),
+        "three_stock": bytearray(),
+        "prefix_hash": array("Q"),  # see chain_prefix_hash
+        "order": None,              # see match_table_order
+        "postings": None,           # see match_postings
+        "tail": deque(maxlen=TABLE_TAIL),
+        "consumed": 0,              # journal: bytes read of the active file
+        "last_seq": 0,              # SQLite: last row read
+    }
+    for column in ("p1", "c1", "p2", "c2", "new1", "diff1", "new2", "diff2"):
+        table[column] = array("i")
+    return table
+
+# "07:30 PM" for each minute of the day
+_minute_labels = [f"{h % 12 or 12:02d}:{m:02d} {'PM' if h >= 12 else 'AM'}" for h in range(24) for m in range(60)]
+
+def format_time_key(key, days=None):
+    """The "%Y-%m-%d %I:%M %p" timestamp for a time_key. `days` caches dates."""
+    ordinal = key // 1440
+    day = days.get(ordinal) if days is not None else None
+    if day is None:
+        day = datetime.fromordinal(ordinal).strftime("%Y-%m-%d ")
+        if days is not None:
+            days[ordinal] = day
+    return day + _minute_labels[key % 1440]
+
+def extend_match_table(table, entries):
+    """Appends log entries to the table's columns."""
+    memo = {}
+    days = {}
+    player_ids, player_names = table["player_ids"], table["player_names"]
+    char_ids, char_names = table["char_ids"], table["char_names"]
+    p1s, c1s, p2s, c2s = table["p1"], table["c1"], table["p2"], table["c2"]
+    new1s, diff1s, new2s, diff2s = table["new1"], table["diff1"], table["new2"], table["diff2"]
+    keys, unparsed, timestamps = table["keys"], table["unparsed"], table["timestamps"]
+    prefix_hash = table["prefix_hash"]
+
+    for m in entries:
+        index = table["length"]
+        p1s.append(intern(player_ids, player_names, m["p1"]))
+        c1s.append(intern(char_ids, char_names, m["c1"]))
+        p2s.append(intern(player_ids, player_names, m["p2"]))
+        c2s.append(intern(char_ids, char_names, m["c2"]))
+        for column, field in ((new1s, "new1"), (diff1s, "diff1"), (new2s, "new2"), (diff2s, "diff2")):
+            value = m.get(field)
+            column.append(MISSING if value is None else int(value))
+        table["p1_won"].append(m["winner"] == "p1")
+        table["three_stock"].append(bool(m.get("three_stock")))
+        prefix_hash.append(chain_prefix_hash(prefix_hash[-1] if index else 0, m))
+
+        key = entry_time_key(m, memo)
+        if key is None:
+            unparsed.add(index)
+            key = synthetic_time_key(index)
+        keys.append(key)
+        # Nearly every timestamp is just the formatted key
+        timestamp = m.get("timestamp")
+        if index in unparsed or timestamp != format_time_key(key, days):
+            timestamps[index] = timestamp
+
+        table["tail"].append(m)
+        table["length"] = index + 1     # readers only look below this
+
+def match_table():
+    """The match log as a compact table, current with storage. Shared; don't mutate."""
+    if STORAGE_BACKEND == "sqlite":
+        stamp = ("sqlite",) + tuple(db_version(db_connect(), "matches"))
+    else:
+        stamp = file_stamp(journal_segments(MATCH_LOG_JOURNAL) or [MATCH_LOG_FILE])
+
+    with _match_table_lock:
+        old_stamp, table = _match_table["stamp"], _match_table["table"]
+        if table is not None and old_stamp == stamp:
+            return table
+
+        if STORAGE_BACKEND == "sqlite":
+            # Appends only add rows; a rewrite starts a new generation
+            if table is None or old_stamp[0] != "sqlite" or old_stamp[2] != stamp[2]:
+                table = empty_match_table()
+            with db_transaction() as conn:
+                rows = conn.execute("SELECT seq, data FROM matches WHERE seq > ? ORDER BY seq",
+                                    (table["last_seq"],))
+                while True:
+                    batch = rows.fetchmany(1000)
+                    if not batch:
+                        break
+                    extend_match_table(table, [json.loads(data) for _, data in batch])
+                    table["last_seq"] = batch[-1][0]
+        else:
+            # Same test as load_journal: only the active journal file got longer
+            grew = (
+                table is not None and old_stamp and stamp and old_stamp[0] != "sqlite"
+                and stamp[-1][0] == MATCH_LOG_JOURNAL
+                and old_stamp[:-1] == stamp[:-1]
+                and old_stamp[-1][:2] == stamp[-1][:2]
+                and old_stamp[-1][2] <= stamp[-1][2]
+            )
+            if grew:
+                records, table["consumed"] = read_journal_segment(MATCH_LOG_JOURNAL, table["consumed"])
+                extend_match_table(table, records)
+            else:
+                # One segment's parsed entries at a time
+                table = empty_match_table()
+                segments = journal_segments(MATCH_LOG_JOURNAL)
+                for segment in segments:
+                    records, table["consumed"] = read_journal_segment(segment)
+                    extend_match_table(table, records)
+                if not segments and os.path.exists(MATCH_LOG_FILE):
+                    extend_match_table(table, read_json(MATCH_LOG_FILE))
+
+        _match_table.update(stamp=stamp, table=table)
+        return table
+
+def match_row(table, index):
+    """Log entry `index` rebuilt from the table (the fields index_match and
+    match_fingerprint read)."""
+    names, chars = table["player_names"], table["char_names"]
+    timestamps = table["timestamps"]
+    row = {
+        "timestamp": timestamps[index] if index in timestamps else format_time_key(table["keys"][index]),
+        "p1": names[table["p1"][index]],
+        "c1": chars[table["c1"][index]],
+        "p2": names[table["p2"][index]],
+        "c2": chars[table["c2"][index]],
+        "winner": "p1" if table["p1_won"][index] else "p2",
+        "three_stock": bool(table["three_stock"][index]),
+    }
+    for field in ("new1", "diff1", "new2", "diff2"):
+        value = table[field][index]
+        if value != MISSING:
+            row[field] = value
+    return row
+
+def match_table_order(table):
+    """Chronological index into the table (a stable sort by time key).
+
+    When the table only grew and the new matches are not older than the
+    rest (the normal append case), the index is extended, not re-sorted.
+    """
+    with _match_table_lock:
+        order = table["order"]
+        length = table["length"]
+        keys = table["keys"]
+        done = len(order) if order is not None else 0
+        if done == length:
+            return order
+        if done and all(keys[i - 1] <= keys[i] for i in range(done, length)) \
+                and keys[order[-1]] <= keys[done]:
+            order = order + array("i", range(done, length))
+        else:
+            order = array("i", sorted(range(length), key=keys.__getitem__))
+        table["order"] = order
+        return order
+
+
+# -----------------------------
+# Columnar match store
+# -----------------------------
+# The match table on disk for analytics: one raw fixed-width file per
+# column (native byte order) in MATCH_COLUMNS_DIR, plus dictionary.json
+# with the player and character names, the timestamps that aren't just
+# their time key and the number of rows. open_match_columns() maps the
+# files, so a full-history scan reads contiguous memory (NumPy views when
+# it's installed) instead of parsing the log. Appends only extend the
+# column files; dictionary.json is replaced last, so a reader never counts
+# rows that aren't written yet.
+
+MATCH_COLUMNS_FILE = f"{MATCH_COLUMNS_DIR}/dictionary.json"
+MATCH_COLUMN_TYPES = {
+    "p1": "i", "c1": "i", "p2": "i", "c2": "i",
+    "new1": "i", "diff1": "i", "new2": "i", "diff2": "i",
+    "keys": "q", "p1_won": "B", "three_stock": "B",
+}
+
+def match_column_path(name):
+    return f"{MATCH_COLUMNS_DIR}/{name}.bin"
+
+def load_match_columns_dictionary():
+    try:
+        return read_json(MATCH_COLUMNS_FILE)
+    except (OSError, ValueError):
+        return None
+
+def reset_match_columns():
+    """Forces a full rewrite on the next update (the log was rewritten)."""
+    if os.path.exists(MATCH_COLUMNS_FILE):
+        os.remove(MATCH_COLUMNS_FILE)
+
+def stored_match_rows(dictionary, table):
+    """How many stored rows are still the table's first rows (0 = rewrite)."""
+    if not dictionary or dictionary.get("byteorder") != sys.byteorder \
+            or dictionary.get("columns") != MATCH_COLUMN_TYPES:
+        return 0
+    done = dictionary["length"]
+    if not done or done > table["length"]:
+        return 0
+    # Names are interned in first-seen order, so a grown log only adds names
+    for key, names in (("players", table["player_names"]), ("characters", table["char_names"])):
+        if names[:len(dictionary[key])] != dictionary[key]:
+            return 0
+    if dictionary["last_match"] != match_fingerprint(match_row(table, done - 1)):
+        return 0
+    for name, typecode in MATCH_COLUMN_TYPES.items():
+        if os.path.getsize(match_column_path(name)) < done * array(typecode).itemsize:
+            return 0
+    return done
+
+def update_match_columns():
+    """Brings the column store up to date with the match log, appending only
+    the new rows when the stored ones still match. Returns the dictionary.
+    Like the stats index, an unchanged log stamp skips the match table."""
+    with data_lock():
+        log_stamp = match_log_stamp()
+        dictionary = load_match_columns_dictionary()
+        if dictionary and dictionary.get("log_stamp") == log_stamp \
+                and dictionary.get("byteorder") == sys.byteorder \
+                and dictionary.get("columns") == MATCH_COLUMN_TYPES:
+            return dictionary
+        table = match_table()
+        done = stored_match_rows(dictionary, table)
+        with _match_table_lock:
+            length = table["length"]
+            players, chars = list(table["player_names"]), list(table["char_names"])
+            timestamps = {str(i): ts for i, ts in table["timestamps"].items() if i < length}
+            unparsed = sorted(i for i in table["unparsed"] if i < length)
+
+        os.makedirs(MATCH_COLUMNS_DIR, exist_ok=True)
+        for name, typecode in MATCH_COLUMN_TYPES.items():
+            rows = table[name][done:length]
+            path = match_column_path(name)
+            if not done:
+                tmp_path = write_temp_file(path, lambda f: f.write(rows), mode="wb")
+                os.replace(tmp_path, path)
+                continue
+            with timed("save"), open(path, "r+b") as f:
+                f.seek(done * array(typecode).itemsize)
+                f.write(rows)
+                f.truncate()    # drop any rows an interrupted update left behind
+                f.flush()
+                os.fsync(f.fileno())
+            count_io("written", len(rows) * array(typecode).itemsize)
+
+        dictionary = {
+            "length": length,
+            "byteorder": sys.byteorder,
+            "columns": MATCH_COLUMN_TYPES,
+            "missing": MISSING,
+            "players": players,
+            "characters": chars,
+            "timestamps": timestamps,
+            "unparsed": unparsed,
+            "last_match": match_fingerprint(match_row(table, length - 1)) if length else None,
+            "log_stamp": log_stamp,
+        }
+        write_json_atomic(MATCH_COLUMNS_FILE, dictionary, indent=None)
+        return dictionary
+
+def open_match_columns():
+    """The column store, current with the log and mapped read-only.
+
+    Returns the dictionary with one memoryview per column added (cast to
+    the column's type, `length` rows). numpy.asarray() on a view gives an
+    array over the same memory; nothing is copied either way. Rows are in
+    log order; sort by "keys" for chronological order.
+    """
+    columns = dict(update_match_columns())
+    columns["timestamps"] = {int(i): ts for i, ts in columns["timestamps"].items()}
+    for name, typecode in MATCH_COLUMN_TYPES.items():
+        size = columns["length"] * array(typecode).itemsize
+        if not size:
+            columns[name] = memoryview(array(typecode))     # mmap can't map 0 bytes
+            continue
+        with open(match_column_path(name), "rb") as f:
+            # The mapping outlives the file object
+            columns[name] = memoryview(mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)).cast(typecode)
+    return columns
+
+
+# -----------------------------
+# Match queries
+# -----------------------------
+# Filtered pages of the match log (/api/matches, /character/<name>),
+# answered from the match table: secondary indexes (match_postings) list
+# the positions for a player, character, (player, character) or opponent
+# pair, a date range is cut out of the chronological order by binary
+# search, and a page resumes right after its cursor (the seq of the last
+# match returned; seq = log position + 1), so a query only looks at the
+# rows it returns.
+
+MATCH_PAGE_SIZE = 100
+MATCH_PAGE_MAX = 1000
+
+def order_bound(order, keys, key):
+    """First i with keys[order[i]] >= key (order is sorted by keys)."""
+    lo, hi = 0, len(order)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if keys[order[mid]] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def match_postings(table):
+    """Secondary indexes over the table: ascending log positions by player
+    id, character id, (player, character) and opponent pair (lower id
+    first). Built on first use and extended in place as the table grows;
+    a rewritten log gets a new table, so they are rebuilt on demand."""
+    with _match_table_lock:
+        postings = table["postings"]
+        if postings is None:
+            postings = table["postings"] = {
+                "length": 0, "player": {}, "character": {}, "player_character": {}, "pair": {},
+            }
+        length = table["length"]
+        if postings["length"] == length:
+            return postings
+
+        def add(index, key, position):
+            positions = index.get(key)
+            if positions is None:
+                positions = index[key] = array("i")
+            positions.append(position)
+
+        by_player, by_char = postings["player"], postings["character"]
+        by_player_char, by_pair = postings["player_character"], postings["pair"]
+        p1s, c1s, p2s, c2s = table["p1"], table["c1"], table["p2"], table["c2"]
+        for i in range(postings["length"], length):
+            p1, c1, p2, c2 = p1s[i], c1s[i], p2s[i], c2s[i]
+            add(by_player, p1, i)
+            add(by_char, c1, i)
+            add(by_player_char, (p1, c1), i)
+            if p2 != p1:
+                add(by_player, p2, i)
+            if c2 != c1:
+                add(by_char, c2, i)
+            if (p2, c2) != (p1, c1):
+                add(by_player_char, (p2, c2), i)
+            add(by_pair, (p1, p2) if p1 <= p2 else (p2, p1), i)
+        postings["length"] = length
+        return postings
+
+def match_positions(table, player=None, opponent=None, character=None, since=None, until=None,
+                    three_stock=None, cursor=None, descending=False):
+    """Yields the log positions matching every given filter, in seq order
+    (newest first when descending), after `cursor`.
+
+    Names are matched exactly; an unknown one matches nothing. `character`
+    is the player's character when `player` is given, else either side's.
+    `opponent` needs `player`. since/until are inclusive time keys;
+    entries without a real timestamp never match a date range.
+
+    Candidates come from the narrowest secondary index (or the date range
+    cut from the chronological order, when that is smaller), so the cost
+    follows the matches looked at, not the size of the log.
+    """
+    length = table["length"]
+    ids = []
+    for name, lookup in ((player, "player_ids"), (opponent, "player_ids"), (character, "char_ids")):
+        if name is None:
+            ids.append(None)
+        elif name in table[lookup]:
+            ids.append(table[lookup][name])
+        else:
+            return
+    player, opponent, character = ids
+
+    candidates = range(length)
+    if player is not None or character is not None:
+        postings = match_postings(table)
+        if player is not None and opponent is not None:
+            key = (player, opponent) if player <= opponent else (opponent, player)
+            candidates = postings["pair"].get(key)
+        elif player is not None and character is not None:
+            candidates = postings["player_character"].get((player, character))
+        elif player is not None:
+            candidates = postings["player"].get(player)
+        else:
+            candidates = postings["character"].get(character)
+        if candidates is None:
+            return
+
+    dated = since is not None or until is not None
+    keys, unparsed = table["keys"], table["unparsed"]
+    if dated:
+        order = match_table_order(table)
+        lo = order_bound(order, keys, since) if since is not None else 0
+        hi = order_bound(order, keys, until + 1) if until is not None else length
+        if hi - lo < len(candidates):
+            candidates = sorted(order[lo:hi])
+
+    # Walk the candidates from the cursor by index (no copies)
+    if descending:
+        end = bisect.bisect_left(candidates, cursor - 1) if cursor else len(candidates)
+        walk = range(end - 1, -1, -1)
+    else:
+        walk = range(bisect.bisect_left(candidates, cursor) if cursor else 0, len(candidates))
+
+    p1s, c1s, p2s, c2s = table["p1"], table["c1"], table["p2"], table["c2"]
+    three_stocks = table["three_stock"]
+    for j in walk:
+        i = candidates[j]
+        if i >= length:
+            continue    # appended after this query started
+        if player is not None:
+            if p1s[i] == player:
+                mine, other = c1s[i], p2s[i]
+            elif p2s[i] == player:
+                mine, other = c2s[i], p1s[i]
+            else:
+                continue
+            if opponent is not None and other != opponent:
+                continue
+            if character is not None and mine != character:
+                continue
+        elif character is not None and c1s[i] != character and c2s[i] != character:
+            continue
+        if dated and (i in unparsed or (since is not None and keys[i] < since)
+                      or (until is not None and keys[i] > until)):
+            continue
+        if three_stock is not None and bool(three_stocks[i]) != three_stock:
+            continue
+        yield i
+
+def match_record(table, index):
+    """A log entry as the API returns it."""
+    return dict(seq=index + 1, **match_row(table, index))
+
+
+# -----------------------------
+# Rating checkpoints
+# -----------------------------
+# Ratings + global offsets after the first `position` log entries, saved
+# every CHECKPOINT_EVERY matches (and at least daily) so rebuilds and "as
+# of" queries only walk the tail. Rebuild checkpoints hold replay_ratings()
+# state; the ones saved on append hold the logged ratings (logged_ratings),
+# which are the same thing for a rebuilt prefix. A checkpoint stays valid
+# while every log entry it covers is unchanged: it records the running
+# hash of those entries (chain_prefix_hash), so editing an early match
+# invalidates every checkpoint after it.
+
+def match_fingerprint(m):
+    return [m.get("timestamp"), m["p1"], m["c1"], m["p2"], m["c2"], m["winner"],
+            bool(m.get("three_stock"))]
+
+def chain_prefix_hash(previous, m):
+    """Running hash of the log through `m`, given the hash through the entry
+    before it (0 for the first). 64-bit, so it fits an array("Q")."""
+    data = "\x1f".join(map(str, match_fingerprint(m))).encode()
+    digest = hashlib.blake2b(previous.to_bytes(8, "little") + data, digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def prefix_hashes(log):
+    """chain_prefix_hash after each entry of `log` (like a match_table()'s
+    "prefix_hash" column)."""
+    hashes = array("Q")
+    previous = 0
+    for m in log:
+        previous = chain_prefix_hash(previous, m)
+        hashes.append(previous)
+    return hashes
 
+def prefix_digest(hashes, position):
+    """What a checkpoint after the first `position` entries records."""
+    return f"{hashes[position - 1]:016x}"
 
+def checkpoint_path(position):
+    return f"{CHECKPOINT_DIR}/ratings_{position:09d}.json"
+
+def list_checkpoints():
+    """Checkpoint positions, oldest first."""
+    positions = []
+    for path in glob.glob(f"{glob.escape(CHECKPOINT_DIR)}/ratings_*.json"):
+        try:
+            positions.append(int(os.path.basename(path)[len("ratings_"):-len(".json")]))
+        except ValueError:
+            continue
+    return sorted(positions)
+
+def save_checkpoint(last, position, prefix_hash, players, offsets, rebuilt=False):
+    """`last` is log entry position - 1 and `prefix_hash` its prefix_digest.
+    rebuilt=True marks checkpoints whose covered entries hold replayed values."""
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    checkpoint = {
+        "position": position,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "time": match_time(last),
+        "prefix_hash": prefix_hash,
+        "rebuilt": rebuilt,
+        "ratings": players,
+        "offsets": offsets,
+    }
+    write_json_atomic(checkpoint_path(position), checkpoint, indent=None)
+
+def load_checkpoint(position):
+    path = checkpoint_path(position)
+    def read():
+        try:
+            return read_json(path)
+        except (OSError, ValueError):
+            return None
+    return cached_load(path, [path], read)
+
+def clear_checkpoints(after=0):
+    for position in list_checkpoints():
+        if position > after:
+            os.remove(checkpoint_path(position))
+            invalidate_snapshot(checkpoint_path(position))
+
+def checkpoint_matches(checkpoint, hashes):
+    """True if the log whose prefix hashes are `hashes` (at least
+    checkpoint["position"] of them) still starts with exactly the entries
+    the checkpoint was replayed from."""
+    return checkpoint.get("prefix_hash") == prefix_digest(hashes, checkpoint["position"])
+
+def find_checkpoint(length, hashes, limit=None, rebuilt_only=False):
+    """Latest checkpoint that still matches the log and covers at most `limit`
+    entries. `hashes` are the log's prefix hashes (prefix_hashes() or a
+    match_table()'s "prefix_hash")."""
+    for position in reversed(list_checkpoints()):
+        if position > length or (limit is not None and position > limit):
+            continue
+        checkpoint = load_checkpoint(position)
+        if not checkpoint or (rebuilt_only and not checkpoint.get("rebuilt")):
+            continue
+        if checkpoint_matches(checkpoint, hashes):
+            return checkpoint
+    return None
+
+def update_checkpoints():
+    """Called after an append: saves a new checkpoint when one is due."""
+    if not CHECKPOINT_EVERY:
+        return
+    table = match_table()
+    length = table["length"]
+    latest = find_checkpoint(length, table["prefix_hash"])
+    position = latest["position"] if latest else 0
+
+    due = length - position >= CHECKPOINT_EVERY or (
+        latest and length > position
+        and latest["created"][:10] < datetime.now().strftime("%Y-%m-%d")
+    )
+    if not due:
+        return
+
+    players = logged_ratings(table, range(position, length), start=latest)
+    offsets = {name: sum(v - 1000 for v in chars.values()) for name, chars in players.items()}
+    save_checkpoint(match_row(table, length - 1), length,
+                    prefix_digest(table["prefix_hash"], length), players, offsets)
+
+def ratings_as_of(when):
+    """Logged ratings including every match up to `when` (a datetime).
+
+    Returns (players, matches_applied). Starts from the latest checkpoint
+    inside the already-chronological prefix of the log.
+    """
+    table = match_table()
+    order = match_table_order(table)
+    keys = table["keys"]
+    cutoff = time_key(when)
+
+    prefix = sorted_prefix_length(order)
+    start = None
+    for position in reversed(list_checkpoints()):
+        if position > prefix or position > len(order) or keys[position - 1] > cutoff:
+            continue
+        checkpoint = load_checkpoint(position)
+        if checkpoint and checkpoint_matches(checkpoint, table["prefix_hash"]):
+            start = checkpoint
+            break
+
+    first = start["position"] if start else 0
+    tail = []
+    for index in order[first:]:
+        if keys[index] > cutoff:
+            break
+        tail.append(index)
+
+    players = logged_ratings(table, tail, start=start)
+    return players, first + len(tail)
+
+
+# -----------------------------
+# Conditional GET
+# -----------------------------
+# Read-only pages and API responses carry an ETag built from the data
+# version, so a refresh with nothing new costs a 304 instead of a render.
+# The tag also includes the date (decay changes ratings daily without a
+# write) and the deployed code version (template changes).
+
+ETAG_SALT = os.getenv("RENDER_GIT_COMMIT", "")[:12] or str(int(os.path.getmtime(__file__)))
+
+def load_data_version():
+    def read():
+        try:
+            return read_json(DATA_VERSION_FILE)
+        except (OSError, ValueError):
+            return None
+    return cached_load(DATA_VERSION_FILE, [DATA_VERSION_FILE], read) \
+        or {"id": "0", "version": 0, "updated": 0}
+
+def bump_data_version():
+    """Marks the data as changed. Call with data_lock() held."""
+    current = load_data_version()
+    write_json_atomic(DATA_VERSION_FILE, {
+        # A fresh id if the file was lost, so old ETags can't match again
+        "id": current["id"] if current["version"] else os.urandom(4).hex(),
+        "version": current["version"] + 1,
+        "updated": time.time(),
+    })
+
+def data_validators():
+    """(etag, last_modified) for the current data version."""
+    version = load_data_version()
+    today = datetime.now()
+    etag = f"{version['id']}-{version['version']}-{today.strftime('%Y%m%d')}-{ETAG_SALT}"
+    midnight = today.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    return etag, datetime.fromtimestamp(int(max(version["updated"], midnight)), timezone.utc)
+
+def conditional_get(f):
+    """Answers 304 when the client's copy matches the current data version."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        etag, last_modified = data_validators()
+
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = Response(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            # The view itself may have written (e.g. new players on /scoreboard)
+            etag, last_modified = data_validators()
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers["Cache-Control"] = "no-cache"   # always revalidate
+        return response
+    return decorated
+
+
+# Rendered pages for the current data version, least recently used first.
+# Entries are dropped as soon as the version (see data_validators) changes.
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "64"))
+_page_cache = OrderedDict()   # request path -> rendered HTML
+_page_cache_state = {"etag": None}
+_page_cache_lock = threading.Lock()
+page_cache_stats = {"hits": 0, "misses": 0}
+
+def cached_page(f):
+    """Serves the view's rendered HTML from memory until the data changes."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        etag, _ = data_validators()
+        key = request.full_path
+
+        with _page_cache_lock:
+            if _page_cache_state["etag"] != etag:
+                _page_cache.clear()
+                _page_cache_state["etag"] = etag
+            html = _page_cache.get(key)
+            if html is not None:
+                _page_cache.move_to_end(key)
+                page_cache_stats["hits"] += 1
+                return html
+            page_cache_stats["misses"] += 1
+
+        html = f(*args, **kwargs)
+        if not isinstance(html, str):
+            return html     # errors, redirects
+
+        # Skip pages rendered while the data changed underneath
+        if data_validators()[0] == etag:
+            with _page_cache_lock:
+                if _page_cache_state["etag"] == etag:
+                    _page_cache[key] = html
+                    while len(_page_cache) > PAGE_CACHE_SIZE:
+                        _page_cache.popitem(last=False)
+        return html
+    return decorated
 
 
 def check_auth(username, password):
@@ -433,91 +3025,30 @@ def home_redirect():
 
 
 @app.route("/leaderboard")
+@conditional_get
+@cached_page
 def leaderboard():
-    data = load_players()
-        # --- APPLY ELO DECAY SAFELY ---
-    for pname, pdata in data.items():
-        apply_decay_to_player(pdata)
-
-    save_players(data)
-
-
     # Load last result safely
     try:
-        with open(LAST_RESULT_FILE, "r") as f:
-            last_result = json.load(f)
+        last_result = load_last_result() or None
     except:
         last_result = None
 
-    log = load_match_log()
-
-
-    # Build leaderboard rows
-    rows = []
-    for player, char_map in data.items():
-
-        # Only include REAL characters — prevents global_elo, last_played, etc.
-        clean_map = {
-            c: v for c, v in char_map.items()
-            if c in CHARACTERS and isinstance(v, (int, float))
-        }
-
-        diffs = [(v - 1000) for v in clean_map.values()]
-        global_elo = sum(diffs)
-
-        rows.append((player, global_elo, clean_map))
 
-
-
-    # Sort by ELO (descending)
-    rows.sort(key=lambda x: x[1], reverse=True)
+    # Ratings with inactivity decay applied on the fly (nothing is saved);
+    # global ELO is each player's row sum in the ratings matrix
+    matrix = ratings_matrix()
+    rows = sorted(zip(matrix["names"], matrix["global"]), key=lambda x: x[1], reverse=True)
 
     # Build rank lookup table: {"Will": 1, "Nick R": 2, ...}
-    rank_map = {player: i + 1 for i, (player, _, _) in enumerate(rows)}
-
-    # Load match log once
-    log = load_match_log()
+    rank_map = {player: i + 1 for i, (player, _) in enumerate(rows)}
 
-        # Compute win streaks
-    from collections import defaultdict
+    # Current win streaks come from the stats index (no log replay)
+    win_streaks = current_streaks(load_match_stats())
 
-    def compute_win_streaks(match_log):
-        streaks = defaultdict(int)
-
-        for m in match_log:
-            winner = m["p1"] if m["winner"] == "p1" else m["p2"]
-            loser = m["p2"] if winner == m["p1"] else m["p1"]
-
-            streaks[winner] += 1
-            streaks[loser] = 0
-
-        return streaks
-
-    win_streaks = compute_win_streaks(log)
-
-
-    # Last 20 matches, newest → oldest
-    # --- Build Recent Matches Sorted by Timestamp ---
-    from datetime import datetime
-
-    def parse_time(entry):
-        ts = entry.get("timestamp", "")
-        try:
-            # preferred 12-hour timestamp
-            return datetime.strptime(ts, "%Y-%m-%d %I:%M %p")
-        except:
-            try:
-                # legacy 24-hour timestamp
-                return datetime.strptime(ts, "%Y-%m-%d %H:%M")
-            except:
-                # Handle missing or invalid timestamps
-                return datetime.min   # pushes old/no-timestamp entries to the bottom
-
-    # Sort all matches chronologically
-    log_sorted = sorted(log, key=parse_time)
-
-    # Take the last 20 (newest), then reverse so newest → oldest
-    recent_matches = log_sorted[-20:][::-1]
+    # Last 20 matches, newest → oldest, read from the end of the log
+    # (appends keep the log in chronological order)
+    recent_matches = recent_match_entries(20)
 
 
     # Render page
@@ -547,9 +3078,10 @@ def leaderboard():
 
 
 @app.route("/player/<name>")
+@conditional_get
+@cached_page
 def player_stats(name):
-    data = load_players()
-    match_log = load_match_log()
+    data = effective_players()
 
     if name not in data:
         return f"Player '{name}' not found.", 404
@@ -558,8 +3090,11 @@ def player_stats(name):
     # Pull badges safely
     badges_list = data[name].get("badges", [])
 
-    # Remove badges entry from character ratings
-    char_map = {c: v for c, v in data[name].items() if c != "badges"}
+    # Keep only character ratings (drops badges, last_played, decay_through)
+    char_map = {
+        c: v for c, v in data[name].items()
+        if c != "badges" and isinstance(v, (int, float))
+    }
 
     total_chars = len(char_map)
 
@@ -570,23 +3105,12 @@ def player_stats(name):
         best_char = None
         worst_char = None
 
-    # Stats
-    total_matches = 0
-    wins = 0
-    losses = 0
-
-    for m in match_log:
-        if m["p1"] == name or m["p2"] == name:
-            total_matches += 1
-
-            if m["winner"] == "p1" and m["p1"] == name:
-                wins += 1
-            elif m["winner"] == "p2" and m["p2"] == name:
-                wins += 1
-            else:
-                losses += 1
-
-    win_rate = round((wins / total_matches) * 100, 1) if total_matches > 0 else 0
+    # Stats (precomputed in the stats index, no log scan)
+    record = load_match_stats()["players"].get(name) or player_record(empty_stats_index(), name)
+    total_matches = record["matches"]
+    wins = record["wins"]
+    losses = record["losses"]
+    win_rate_pct = win_rate(record)
 
     # ----- Manual Badges -----
     player_badges = []
@@ -686,20 +3210,107 @@ def player_stats(name):
         total_matches=total_matches,
         wins=wins,
         losses=losses,
-        win_rate=win_rate,
+        win_rate=win_rate_pct,
+        three_stocks=record["three_stocks"],
+        three_stocked=record["three_stocked"],
+        first_match=record["first_match"],
+        last_match=record["last_match"],
+        char_records=record["characters"],
         badges=player_badges,
         all_players=all_players
     )
 
 
+@app.route("/character/<path:name>")
+@conditional_get
+@cached_page
+def character_page(name):
+    table = match_table()
+    if name not in table["char_ids"]:
+        return f"Character '{name}' not found.", 404
+
+    # Only this character's matches, from the secondary index
+    cid = table["char_ids"][name]
+    length = table["length"]
+    positions = match_postings(table)["character"].get(cid, array("i"))
+    p1s, c1s, p2s, c2s = table["p1"], table["c1"], table["p2"], table["c2"]
+    p1_won, three_stock = table["p1_won"], table["three_stock"]
+
+    matches = wins = losses = mirrors = three_stocks = 0
+    against = {}    # opposing character -> [wins, losses]
+    for i in positions:
+        if i >= length:
+            continue
+        matches += 1
+        if c1s[i] == c2s[i]:
+            mirrors += 1        # a win and a loss for the character; left out of W-L
+            continue
+        won = bool(p1_won[i]) == (c1s[i] == cid)
+        other = c2s[i] if c1s[i] == cid else c1s[i]
+        record = against.setdefault(table["char_names"][other], [0, 0])
+        if won:
+            wins += 1
+            record[0] += 1
+            three_stocks += three_stock[i]
+        else:
+            losses += 1
+            record[1] += 1
+
+    matchups = sorted(
+        ({"character": other, "wins": w, "losses": l, "win_rate": win_rate({"wins": w, "losses": l})}
+         for other, (w, l) in against.items()),
+        key=lambda row: (-(row["wins"] + row["losses"]), row["character"]),
+    )[:10]
+
+    # Current (decayed) ratings with this character, best first
+    stats = load_match_stats()["players"]
+    top_players = []
+    if name in CHARACTERS:
+        matrix = ratings_matrix()
+        column = CHARACTERS.index(name)
+        for pid, player in enumerate(matrix["names"]):
+            cell = pid * len(CHARACTERS) + column
+            if matrix["rated"][cell]:
+                record = (stats.get(player) or {}).get("characters", {}).get(name) or {"wins": 0, "losses": 0}
+                top_players.append({
+                    "player": player, "rating": matrix["deviation"][cell] + 1000,
+                    "wins": record["wins"], "losses": record["losses"], "win_rate": win_rate(record),
+                })
+        top_players.sort(key=lambda row: (-row["rating"], row["player"]))
+
+    recent = [match_row(table, i) for i in itertools.islice(reversed(positions), 10) if i < length]
+
+    return render_template(
+        "character.html",
+        name=name,
+        matches=matches,
+        wins=wins,
+        losses=losses,
+        mirrors=mirrors,
+        three_stocks=three_stocks,
+        win_rate=win_rate({"wins": wins, "losses": losses}),
+        usage=round(matches / length * 100, 1) if length else 0,
+        top_players=top_players[:10],
+        matchups=matchups,
+        recent_matches=recent
+    )
+
+
 @app.route("/reset", methods=["POST"])
 def reset():
+    if STORAGE_BACKEND == "sqlite":
+        db_reset()
     if os.path.exists(DATA_FILE):
         os.remove(DATA_FILE)
     if os.path.exists(MATCH_LOG_FILE):
         os.remove(MATCH_LOG_FILE)
+    for segment in journal_segments(MATCH_LOG_JOURNAL):
+        os.remove(segment)
+    reset_stats_index(MATCH_STATS_FILE)
+    reset_match_columns()
     if os.path.exists(LAST_RESULT_FILE):
         os.remove(LAST_RESULT_FILE)
+    bump_data_version()
     return redirect(url_for("index"))
     
 
@@ -721,23 +3332,9 @@ def compute_global_elo(player_name, players_data):
 
 
 
-@app.route("/add_match", methods=["GET", "POST"])
-@requires_auth
-def add_match():
-    if request.method == "GET":
-        return redirect(url_for("matches"))
-
-    p1 = request.form["player1"]
-    c1 = request.form["p1_character"]
-    p2 = request.form["player2"]
-    c2 = request.form["p2_character"]
-    winner = request.form["winner"]
-
-    # Three-stock checkbox
-    three_stock = request.form.get("three_stock") == "on"
-
-    data = load_players()
-
+def rate_match(data, p1, c1, p2, c2, winner, three_stock):
+    """Rates one match into `data` (a private copy of the players) the way
+    add_match does. Returns (old1, new1, old2, new2)."""
     # Initialize character ratings
     if p1 not in data:
         data[p1] = {}
@@ -749,6 +3346,10 @@ def add_match():
     if c2 not in data[p2]:
         data[p2][c2] = 1000
 
+    # Bring any pending inactivity decay into the stored ratings first
+    apply_decay_to_player(data[p1])
+    apply_decay_to_player(data[p2])
+
     old1 = data[p1][c1]
     old2 = data[p2][c2]
 
@@ -756,7 +3357,8 @@ def add_match():
     # NEW CUSTOM ELO UPDATE (replaces old calculate_elo)
     # -------------------------------------------------
 
-    players_data = load_players()
+    # New characters start at 1000, so they add nothing to the global offset
+    players_data = data
 
 
     p1_global = compute_global_elo(p1, players_data)
@@ -815,6 +3417,20 @@ def add_match():
     # Save final ratings
     data[p1][c1] = new1
     data[p2][c2] = new2
+
+    # Playing restarts the inactivity clock
+    today = datetime.now().date().strftime("%Y-%m-%d")
+    for player in (p1, p2):
+        data[player]["last_played"] = today
+        data[player].pop("decay_through", None)
+    return old1, new1, old2, new2
+
+
+def record_match(p1, c1, p2, c2, winner, three_stock):
+    """Rates one match and saves it. Call with data_lock() held."""
+    data = copy.deepcopy(load_players())
+    old1, new1, old2, new2 = rate_match(data, p1, c1, p2, c2, winner, three_stock)
+
     save_players(data)
 
     # Save last match result
@@ -834,8 +3450,7 @@ def add_match():
     })
 
     # Log match history
-    log = load_match_log()
-    log.append({
+    append_match({
         "timestamp": datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %I:%M %p"),
         "p1": p1,
         "c1": c1,
@@ -849,7 +3464,27 @@ def add_match():
         "three_stock": three_stock
     })
 
-    save_match_log(log)
+    bump_data_version()
+
+
+@app.route("/add_match", methods=["GET", "POST"])
+@requires_auth
+def add_match():
+    if request.method == "GET":
+        return redirect(url_for("matches"))
+
+    p1 = request.form["player1"]
+    c1 = request.form["p1_character"]
+    p2 = request.form["player2"]
+    c2 = request.form["p2_character"]
+    winner = request.form["winner"]
+
+    # Three-stock checkbox
+    three_stock = request.form.get("three_stock") == "on"
+
+    # One submission at a time across all workers
+    with data_lock():
+        record_match(p1, c1, p2, c2, winner, three_stock)
 
     # Auto commit/push
     queue_push("Auto-update from match submission")
@@ -859,76 +3494,469 @@ def add_match():
 
 
 
+# -----------------------------
+# Bulk import
+# -----------------------------
+# A session's results at once (the /admin/import upload and
+# import_matches.py). Rows are CSV with a header or JSON lines, using the
+# add_match form fields (player1, p1_character, player2, p2_character,
+# winner, three_stock) or the log's own names (p1, c1, p2, c2), plus an
+# optional timestamp. Every row is checked before anything is rated; the
+# batch is then rated in order in memory (rate_match) and saved with one
+# write per file, one data version bump and one push.
+
+IMPORT_FIELDS = {
+    "p1": ("p1", "player1"),
+    "c1": ("c1", "p1_character"),
+    "p2": ("p2", "player2"),
+    "c2": ("c2", "p2_character"),
+    "winner": ("winner",),
+    "three_stock": ("three_stock",),
+    "timestamp": ("timestamp",),
+}
+IMPORT_MAX_ROWS = 5000
+
+def parse_import(text, fmt=None):
+    """(line number, row dict) pairs from CSV or JSONL text. fmt is "csv",
+    "jsonl" or None to tell from the first character. Raises ValueError."""
+    if fmt is None:
+        fmt = "jsonl" if text.lstrip().startswith("{") else "csv"
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        return [(reader.line_num, row) for row in reader]
+
+    rows = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number}: not valid JSON")
+        if not isinstance(row, dict):
+            raise ValueError(f"line {number}: expected a JSON object")
+        rows.append((number, row))
+    return rows
+
+def validate_import_row(row):
+    """(p1, c1, p2, c2, winner, three_stock, timestamp) or an error message."""
+    values = {}
+    for field, names in IMPORT_FIELDS.items():
+        value = next((row[name] for name in names if row.get(name) not in (None, "")), None)
+        values[field] = value.strip() if isinstance(value, str) else value
+
+    for field in ("p1", "c1", "p2", "c2", "winner"):
+        if not values[field]:
+            return f"missing {IMPORT_FIELDS[field][-1]}"
+    for field in ("p1", "c1", "p2", "c2"):
+        if not isinstance(values[field], str):
+            return f"{IMPORT_FIELDS[field][-1]} must be text"
+    p1, c1, p2, c2 = values["p1"], values["c1"], values["p2"], values["c2"]
+    if p1 == p2:
+        return f"{p1} is on both sides"
+    for char in (c1, c2):
+        if char not in CHARACTERS:
+            return f"unknown character '{char}'"
+
+    # "p1"/"p2" like the form, or the winner's name
+    winner = values["winner"]
+    if str(winner).lower() in ("p1", "p2"):
+        winner = str(winner).lower()
+    elif winner in (p1, p2):
+        winner = "p1" if winner == p1 else "p2"
+    else:
+        return f"winner must be p1, p2, {p1} or {p2}"
+
+    three_stock = values["three_stock"]
+    if not isinstance(three_stock, bool):
+        flag = str(three_stock).lower() if isinstance(three_stock, (str, int)) else None
+        if three_stock is None or flag in ("0", "false", "no", "off", "n"):
+            three_stock = False
+        elif flag in ("1", "true", "yes", "on", "y"):
+            three_stock = True
+        else:
+            return f"three_stock must be true or false, not {json.dumps(three_stock)}"
+
+    timestamp = values["timestamp"]
+    if timestamp:
+        parsed = parse_match_time(timestamp)
+        if parsed is None:
+            return f"unreadable timestamp '{timestamp}'"
+        timestamp = parsed.strftime("%Y-%m-%d %I:%M %p")
+
+    return p1, c1, p2, c2, winner, three_stock, timestamp
+
+def import_order_errors(parsed, now):
+    """Rows that would break the log's time order or are already logged.
+
+    Imported matches are appended, so (like a submission) none may be
+    older than the last logged match, later than `now` or older than the
+    row before it. A timestamped row identical to a logged match is a
+    repeat of an earlier import. Rows without a timestamp get `now` and
+    can't be recognized again. Call with data_lock() held.
+    """
+    table = match_table()
+    order = match_table_order(table)
+    keys = table["keys"]
+    last = keys[order[-1]] if len(order) else None
+    now_key = time_key(parse_match_time(now))
+
+    errors = []
+    previous = None     # (line number, time key) of the row before
+    for number, (p1, c1, p2, c2, winner, three_stock, timestamp) in parsed:
+        key = time_key(parse_match_time(timestamp or now))
+        if timestamp:
+            logged = find_logged_match(table, order, key, {
+                "timestamp": timestamp, "p1": p1, "c1": c1, "p2": p2, "c2": c2,
+                "winner": winner, "three_stock": three_stock,
+            })
+            if logged is not None:
+                errors.append(f"line {number}: already in the log (match #{logged + 1})")
+            elif key > now_key:
+                errors.append(f"line {number}: {timestamp} is in the future")
+            elif last is not None and key < last:
+                errors.append(f"line {number}: {timestamp} is before the last logged match "
+                              f"({format_time_key(last)})")
+            elif previous is not None and key < previous[1]:
+                errors.append(f"line {number}: {timestamp} is before line {previous[0]}")
+        previous = (number, key)
+    return errors
+
+def find_logged_match(table, order, key, entry):
+    """Log position of a match at time key `key` with `entry`'s fingerprint, or None."""
+    fingerprint = match_fingerprint(entry)
+    keys = table["keys"]
+    for i in range(order_bound(order, keys, key), len(order)):
+        if keys[order[i]] != key:
+            break
+        if match_fingerprint(match_row(table, order[i])) == fingerprint:
+            return order[i]
+    return None
+
+def import_matches(rows, dry_run=False):
+    """Checks, rates and (unless dry_run) saves a batch of matches.
+
+    `rows` come from parse_import. Returns {"errors": [...]} when any row
+    is invalid (nothing is rated), else the rated "matches", the rating
+    "changes" (player, character, before, after), "new_players" and the
+    number of "untimestamped" rows. The
+    whole batch runs under data_lock(); rows must not go back in time (see
+    import_order_errors).
+    """
+    if not rows:
+        return {"errors": ["no rows to import"]}
+    if len(rows) > IMPORT_MAX_ROWS:
+        return {"errors": [f"at most {IMPORT_MAX_ROWS} rows per import"]}
+
+    parsed = []
+    errors = []
+    for number, row in rows:
+        result = validate_import_row(row)
+        if isinstance(result, str):
+            errors.append(f"line {number}: {result}")
+        else:
+            parsed.append((number, result))
+    if errors:
+        return {"errors": errors}
+
+    now = datetime.now(MATCH_TIMEZONE).strftime("%Y-%m-%d %I:%M %p")
+    with data_lock():
+        errors = import_order_errors(parsed, now)
+        if errors:
+            return {"errors": errors}
+
+        before = load_players()
+        data = copy.deepcopy(before)
+        entries = []
+        for _, (p1, c1, p2, c2, winner, three_stock, timestamp) in parsed:
+            old1, new1, old2, new2 = rate_match(data, p1, c1, p2, c2, winner, three_stock)
+            entries.append({
+                "timestamp": timestamp or now,
+                "p1": p1,
+                "c1": c1,
+                "new1": new1,
+                "diff1": new1 - old1,
+                "p2": p2,
+                "c2": c2,
+                "new2": new2,
+                "diff2": new2 - old2,
+                "winner": winner,
+                "three_stock": three_stock,
+            })
+
+        changes = []
+        for name in sorted(data):
+            old = before.get(name, {})
+            for char, value in sorted(data[name].items()):
+                if isinstance(value, (int, float)) and old.get(char) != value:
+                    changes.append({"player": name, "character": char, "before": old.get(char), "after": value})
+        report = {
+            "errors": [],
+            "matches": entries,
+            "changes": changes,
+            "new_players": sorted(data.keys() - before.keys()),
+            # Stamped with the import time, so not recognized if applied again
+            "untimestamped": sum(1 for _, row in parsed if not row[6]),
+        }
+        if dry_run:
+            return report
+
+        save_players(data)
+        last = entries[-1]
+        save_last_result(dict(
+            {key: last[key] for key in ("p1", "c1", "new1", "diff1", "p2", "c2", "new2", "diff2")},
+            last_player1=last["p1"], last_player2=last["p2"],
+            last_char1=last["c1"], last_char2=last["c2"],
+        ))
+        append_matches(entries)
+        bump_data_version()
+    return report
+
+
+@app.route("/admin/import", methods=["POST"])
+@requires_auth
+def import_route():
+    """CSV/JSONL upload (or pasted text): previewed with dry_run=on, else applied."""
+    upload = request.files.get("file")
+    fmt = request.form.get("format") or None
+    dry_run = request.form.get("dry_run") == "on"
+    try:
+        if upload and upload.filename:
+            text = upload.read().decode("utf-8-sig")
+            if upload.filename.lower().endswith(".csv"):
+                fmt = "csv"
+            elif upload.filename.lower().endswith((".jsonl", ".ndjson")):
+                fmt = "jsonl"
+        else:
+            text = request.form.get("data", "")
+        report = import_matches(parse_import(text, fmt), dry_run=dry_run)
+    except ValueError as e:    # includes undecodable uploads
+        text = ""
+        report = {"errors": [str(e)]}
+
+    if not dry_run and not report["errors"]:
+        queue_push(f"Auto-update from bulk import ({len(report['matches'])} matches)")
+
+    status = 400 if report["errors"] else 200
+    return render_template("import.html", report=report, dry_run=dry_run, data=text, format=fmt or ""), status
+
+
 @app.route("/admin")
 @requires_auth
 def admin_panel():
+    now = time.time()
+    if is_pushing:
+        pushing_status = "Running"
+    elif push_stats["retry_at"]:
+        pushing_status = f"Backing off ({push_stats['failures']} failed, retry in {max(0, push_stats['retry_at'] - now):.0f}s)"
+    else:
+        pushing_status = "Idle"
+
     return render_template(
         "admin.html",
         queue_length=len(push_queue),
-        pushing_status="Running" if is_pushing else "Idle",
-        push_log=push_log
+        pushing_status=pushing_status,
+        push_log=push_log,
+        push_stats=push_stats,
+        # How long the oldest unsynced submission has been waiting
+        sync_lag=now - push_queue[0][0] if push_queue else 0,
+        last_push_at=datetime.fromtimestamp(push_stats["last_push_at"]).strftime('%Y-%m-%d %H:%M:%S')
+            if push_stats["last_push_at"] else "Never",
+        # This worker's request timings (each gunicorn worker keeps its own)
+        worker_pid=os.getpid(),
+        route_stats=request_stats_summary(),
+        recent_requests=list(recent_requests)[::-1][:20],
+        slow_profiles=list(slow_profiles),
+        profile_sample_rate=PROFILE_SAMPLE_RATE,
     )
 
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/admin/materialize_decay", methods=["POST"])
+@requires_auth
+def materialize_decay_route():
+    if materialize_decay():
+        queue_push("Daily ELO decay")
+    return redirect(url_for("admin_panel"))
+
 @app.route("/api/matchup/<player>/<opponent>")
+@conditional_get
 def api_matchup(player, opponent):
-    log = load_match_log()
+    record = load_match_stats()["players"].get(player)
+    h2h = record["opponents"].get(opponent) if record else None
+    return matchup_summary(h2h)
 
-    wins = 0
-    losses = 0
 
-    for m in log:
-        players_in_match = {m["p1"], m["p2"]}
-
-        if {player, opponent} == players_in_match:
-            winner_name = m["p1"] if m["winner"] == "p1" else m["p2"]
-            if winner_name == player:
-                wins += 1
-            else:
-                losses += 1
+def parse_time_arg(value, end_of_day=False):
+    """A YYYY-MM-DD (start or end of that day) or match timestamp query arg."""
+    when = parse_match_time(value)
+    if when is None:
+        try:
+            when = datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            return None
+        if end_of_day:
+            when = when.replace(hour=23, minute=59)
+    return when
+
+
+@app.route("/api/ratings")
+@conditional_get
+def api_ratings():
+    """Character ratings as of ?as_of=YYYY-MM-DD (end of day) or a full timestamp."""
+    when = parse_time_arg(request.args.get("as_of", ""), end_of_day=True)
+    if when is None:
+        return {"error": "as_of must be YYYY-MM-DD or a match timestamp"}, 400
+
+    players, applied = ratings_as_of(when)
+    return {
+        "as_of": when.strftime("%Y-%m-%d %I:%M %p"),
+        "matches": applied,
+        "ratings": players,
+    }
 
-    total = wins + losses
-    win_rate = round((wins / total) * 100, 1) if total > 0 else 0
 
+@app.route("/api/matches")
+@conditional_get
+def api_matches():
+    """Match history in seq order, one page at a time.
+
+    Filters: ?player, ?opponent (needs player), ?character (the player's,
+    or either side's without a player), ?from / ?to (YYYY-MM-DD or a match
+    timestamp, inclusive) and ?three_stock=1/0. ?order=desc lists newest
+    first. Pages hold ?limit matches (default 100); pass the returned
+    next_cursor as ?cursor to continue. ?format=ndjson streams every match
+    from the cursor on (or ?limit of them), one JSON object per line.
+    """
+    args = request.args
+    filters = {name: args.get(name) or None for name in ("player", "opponent", "character")}
+    if filters["opponent"] and not filters["player"]:
+        return {"error": "opponent needs player"}, 400
+    for name, end_of_day in (("from", False), ("to", True)):
+        if args.get(name):
+            when = parse_time_arg(args[name], end_of_day)
+            if when is None:
+                return {"error": f"{name} must be YYYY-MM-DD or a match timestamp"}, 400
+            filters["since" if name == "from" else "until"] = time_key(when)
+    if args.get("three_stock"):
+        filters["three_stock"] = args["three_stock"] in ("1", "true", "yes")
+
+    cursor = args.get("cursor", 0, type=int)
+    descending = args.get("order") == "desc"
+    stream = args.get("format") == "ndjson"
+    limit = args.get("limit", None if stream else MATCH_PAGE_SIZE, type=int)
+    if limit is not None and not stream:
+        limit = max(1, min(limit, MATCH_PAGE_MAX))
+
+    table = match_table()
+    positions = match_positions(table, cursor=cursor, descending=descending, **filters)
+
+    if stream:
+        if limit is not None:
+            positions = itertools.islice(positions, max(0, limit))
+        def generate():
+            for index in positions:
+                yield json.dumps(match_record(table, index)) + "\n"
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    page = [match_record(table, index) for index in itertools.islice(positions, limit + 1)]
+    more = len(page) > limit
+    page = page[:limit]
     return {
-        "total": total,
-        "wins": wins,
-        "losses": losses,
-        "win_rate": win_rate
+        "matches": page,
+        "next_cursor": page[-1]["seq"] if more else None,
     }
 
 
+@app.route("/api/matchups/<player>")
+@conditional_get
+def api_matchups(player):
+    """Head-to-head against every opponent in one response.
+
+    Add ?characters=1 to include the per character pairing breakdown.
+    """
+    record = load_match_stats()["players"].get(player)
+    if not record:
+        return {}
+
+    include_characters = request.args.get("characters") in ("1", "true", "yes")
+
+    result = {}
+    for opponent, h2h in record["opponents"].items():
+        summary = matchup_summary(h2h)
+        if include_characters:
+            summary["characters"] = h2h["characters"]
+        result[opponent] = summary
+    return result
+
+
 @app.route("/moms-house")
 @requires_auth
 def moms_house():
     players_data = load_players()
-    moms_data = load_moms_house()
     last = load_moms_house_last_result() or {}
-    player_list = sorted(set(players_data.keys()) | set(moms_data.keys()))
+    moms_ratings = load_moms_house()
+    player_list = sorted(set(players_data.keys()) | set(moms_ratings.keys()))
+    last_placements = last.get("placements", [])
+
+    # 8 places by default; ?slots=N for bigger events
+    slots = max(8, len(last_placements), request.args.get("slots", 0, type=int))
+    slots = min(slots, MOMS_HOUSE_MAX_ENTRANTS)
 
     # Ensure every known player has a Mom's House rating
-    updated = False
-    for name in player_list:
-        if name not in moms_data:
-            moms_data[name] = 1000
-            updated = True
-    if updated:
-        save_moms_house(moms_data)
+    if any(name not in moms_ratings for name in player_list):
+        with data_lock():
+            moms_data = dict(load_moms_house())
+            for name in player_list:
+                moms_data.setdefault(name, 1000)
+            save_moms_house(moms_data)
+            bump_data_version()
 
     return render_template(
         "moms_house.html",
         player_list=player_list,
         last=last,
-        last_placements=last.get("placements", [])
+        last_placements=last_placements,
+        slots=slots,
+        max_slots=MOMS_HOUSE_MAX_ENTRANTS
     )
 
 
+def record_moms_house(placements):
+    """Rates one Mom's House result and saves it. Call with data_lock() held."""
+    data = dict(load_moms_house())
+    ratings_before, ratings_after, applied_deltas = rate_moms_house_event(data, placements)
+    save_moms_house(data)
+
+    # Log result
+    timestamp = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %I:%M %p")
+    append_moms_house_log({
+        "timestamp": timestamp,
+        "placements": placements,
+        "before": ratings_before,
+        "after": ratings_after,
+        "delta": applied_deltas
+    })
+
+    save_moms_house_last_result({
+        "timestamp": timestamp,
+        "placements": placements,
+        "after": ratings_after,
+        "delta": applied_deltas
+    })
+
+    bump_data_version()
+
+
 @app.route("/add_moms_house", methods=["POST"])
 @requires_auth
 def add_moms_house():
-    # Collect up to 8 placements in order (1..8)
+    # Collect the placements in order (place_1, place_2, ...)
     placements = []
     seen = set()
-    for i in range(1, 9):
+    for i in range(1, MOMS_HOUSE_MAX_ENTRANTS + 1):
         name = request.form.get(f"place_{i}", "").strip()
         if not name:
             continue
@@ -940,74 +3968,31 @@ def add_moms_house():
     if len(placements) < 2:
         return "Need at least 2 players to submit a match.", 400
 
-    data = load_moms_house()
-    # Initialize players at 1000
-    for name in placements:
-        if name not in data:
-            data[name] = 1000
-
-    # Snapshot ratings before updates
-    ratings_before = {name: data[name] for name in placements}
-    deltas = calculate_moms_house_deltas(placements, ratings_before)
-
-    # Apply deltas with floor at 1000
-    for name in placements:
-        data[name] = max(1000, round(ratings_before[name] + deltas[name]))
-
-    save_moms_house(data)
-
-    # Use applied deltas after floor so losses don't exceed 1000 floor
-    applied_deltas = {name: data[name] - ratings_before[name] for name in placements}
-
-    # Log result
-    log = load_moms_house_log()
-    timestamp = datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %I:%M %p")
-    log.append({
-        "timestamp": timestamp,
-        "placements": placements,
-        "before": ratings_before,
-        "after": {name: data[name] for name in placements},
-        "delta": applied_deltas
-    })
-    save_moms_house_log(log)
-
-    save_moms_house_last_result({
-        "timestamp": timestamp,
-        "placements": placements,
-        "after": {name: data[name] for name in placements},
-        "delta": applied_deltas
-    })
+    with data_lock():
+        record_moms_house(placements)
 
     queue_push("Auto-update from Mom's House submission")
     return redirect(url_for("moms_house"))
 
 
 @app.route("/scoreboard")
+@conditional_get
+@cached_page
 def scoreboard():
     data = load_moms_house()
     players_data = load_players()
     player_list = sorted(set(players_data.keys()) | set(data.keys()))
 
-    updated = False
-    for name in player_list:
-        if name not in data:
-            data[name] = 1000
-            updated = True
-    if updated:
-        save_moms_house(data)
-
-    # Compute win streaks from Mom's House logs (1st place streaks)
-    from collections import defaultdict
-    streaks = defaultdict(int)
-    log = load_moms_house_log()
-    for entry in log:
-        placements = entry.get("placements", [])
-        if not placements:
-            continue
-        winner = placements[0]
-        streaks[winner] += 1
-        for loser in placements[1:]:
-            streaks[loser] = 0
+    if any(name not in data for name in player_list):
+        with data_lock():
+            data = dict(load_moms_house())
+            for name in player_list:
+                data.setdefault(name, 1000)
+            save_moms_house(data)
+            bump_data_version()
+
+    # 1st place win streaks from the Mom's House stats index
+    streaks = current_streaks(load_moms_house_stats())
 
     rows = sorted(data.items(), key=lambda x: x[1], reverse=True)
     return render_template("scoreboard.html", rows=rows, win_streaks=streaks)
@@ -0,0 +1,196 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Times the main routes (Flask test client) and rebuild_match_log.py against
+# a data directory, e.g. one made by generate_data.py, and writes a JSON
+# report. Runs on a temporary copy, so the data directory is never changed.
+#
+#   python benchmark.py --data synthetic --json bench.json
+#   python benchmark.py --data synthetic --compare bench.json
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the app's routes and the rebuild script.")
+    parser.add_argument("--data", default=".", help="data directory to copy and benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="warm runs per route")
+    parser.add_argument("--submissions", type=int, default=20, help="add_match POSTs to time")
+    parser.add_argument("--skip-rebuild", action="store_true")
+    parser.add_argument("--label", default="", help="free-form note stored in the report")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    return parser.parse_args()
+
+
+def summarize(samples, cold=None):
+    ms = sorted(s * 1000 for s in samples)
+    result = {
+        "runs": len(ms),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+    if cold is not None:
+        result["cold_ms"] = round(cold * 1000, 3)
+    return result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "*.py", "templates"],
+                               cwd=REPO_DIR).returncode != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+args = parse_args()
+workdir = tempfile.mkdtemp(prefix="elo_bench_")
+data_dir = os.path.abspath(args.data)
+for name in os.listdir(data_dir):
+    # Only the data files; derived indexes and checkpoints are rebuilt cold
+    if name.endswith((".json", ".jsonl", ".db")) and name not in ("match_stats.json", "moms_house_stats.json"):
+        shutil.copy(os.path.join(data_dir, name), workdir)
+
+# app.py keeps its data in the working directory
+os.chdir(workdir)
+os.environ["ADMIN_USER_1"] = "bench:bench"
+sys.path.insert(0, REPO_DIR)
+import app as elo
+
+client = elo.app.test_client()
+auth = {"Authorization": "Basic " + base64.b64encode(b"bench:bench").decode()}
+
+
+def clear_caches():
+    """Forget everything cached in this process (the files stay as they are)."""
+    elo._snapshot_cache.clear()
+    elo._page_cache.clear()
+    elo._page_cache_state["etag"] = None
+    elo._match_table.update(stamp=None, table=None)
+    elo._decay_view.update(source=None, day=None, players=None)
+    elo._ratings_matrix.update(players=None, matrix=None)
+    elo._stats_indexes.clear()
+
+
+def time_get(url, headers=None):
+    started = time.perf_counter()
+    response = client.get(url, headers=headers)
+    elapsed = time.perf_counter() - started
+    if response.status_code not in (200, 304):
+        raise SystemExit(f"GET {url} returned {response.status_code}")
+    return elapsed, response
+
+
+players = elo.load_players()
+log = elo.load_match_log()
+if not players or not log:
+    raise SystemExit(f"No players or matches in {data_dir}.")
+
+stats = elo.load_match_stats()["players"]
+busiest = sorted(stats, key=lambda name: stats[name]["matches"], reverse=True)
+top_player = busiest[0]
+rival = max(stats[top_player]["opponents"], key=lambda o: stats[top_player]["opponents"][o]["wins"]
+            + stats[top_player]["opponents"][o]["losses"])
+clear_caches()
+for path in (elo.MATCH_STATS_FILE, elo.MOMS_HOUSE_STATS_FILE):
+    elo.reset_stats_index(path)
+
+report = {
+    "created": datetime.now().isoformat(timespec="seconds"),
+    "commit": git_commit(),
+    "label": args.label,
+    "python": platform.python_version(),
+    "data": {
+        "players": len(players),
+        "matches": len(log),
+        "moms_house_events": len(elo.load_moms_house_log()),
+        "storage": elo.STORAGE_BACKEND if elo.STORAGE_BACKEND != "json"
+                   else ("journal" if elo.journal_segments(elo.MATCH_LOG_JOURNAL) else "json"),
+    },
+    "results": {},
+}
+print(f"Benchmarking {len(players)} players / {len(log)} matches "
+      f"({report['data']['storage']}) in {workdir}")
+
+# The first request also builds the stats indexes from scratch
+cold_start, _ = time_get("/leaderboard")
+report["results"]["first_request_with_index_build"] = {"cold_ms": round(cold_start * 1000, 3)}
+
+routes = {
+    "leaderboard": "/leaderboard",
+    "player": f"/player/{top_player}",
+    "api_matchup": f"/api/matchup/{top_player}/{rival}",
+    "api_matchups": f"/api/matchups/{top_player}",
+    "scoreboard": "/scoreboard",
+}
+for name, url in routes.items():
+    clear_caches()
+    cold, response = time_get(url)
+    warm = [time_get(url)[0] for _ in range(args.repeat)]
+    report["results"][name] = summarize(warm, cold)
+
+    # A browser refresh with nothing new
+    etag = response.headers.get("ETag")
+    if etag:
+        revalidate = [time_get(url, {"If-None-Match": etag})[0] for _ in range(args.repeat)]
+        report["results"][name + "_304"] = summarize(revalidate)
+
+# Submissions: each one appends, updates the stats index and invalidates caches
+submissions = []
+for i in range(args.submissions):
+    form = {
+        "player1": busiest[i % len(busiest)], "p1_character": elo.CHARACTERS[i % len(elo.CHARACTERS)],
+        "player2": busiest[(i + 1) % len(busiest)], "p2_character": elo.CHARACTERS[(i * 7) % len(elo.CHARACTERS)],
+        "winner": "p1" if i % 2 else "p2",
+    }
+    started = time.perf_counter()
+    response = client.post("/add_match", data=form, headers=auth)
+    submissions.append(time.perf_counter() - started)
+    if response.status_code != 302:
+        raise SystemExit(f"add_match returned {response.status_code}")
+report["results"]["add_match"] = summarize(submissions)
+# Nothing to push from a scratch directory
+elo.push_queue.clear()
+
+if not args.skip_rebuild:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, "rebuild_match_log.py")],
+                   cwd=workdir, env=dict(os.environ, PYTHONPATH=REPO_DIR),
+                   stdout=subprocess.DEVNULL, check=True)
+    report["results"]["rebuild_match_log"] = {"cold_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+shutil.rmtree(workdir, ignore_errors=True)
+
+previous = None
+if args.compare:
+    with open(args.compare, "r") as f:
+        previous = json.load(f)["results"]
+
+print(f"\n{'benchmark':<34}{'cold ms':>10}{'median ms':>11}{'p95 ms':>10}" + ("  vs before" if previous else ""))
+for name, result in report["results"].items():
+    row = f"{name:<34}{result.get('cold_ms', ''):>10}{result.get('median_ms', ''):>11}{result.get('p95_ms', ''):>10}"
+    if previous and name in previous:
+        key = "median_ms" if "median_ms" in result else "cold_ms"
+        if previous[name].get(key):
+            row += f"  {result[key] / previous[name][key]:.2f}x"
+    print(row)
+
+if args.json:
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\nReport written to {args.json}")
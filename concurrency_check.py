@@ -0,0 +1,153 @@
+import argparse
+import base64
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+# Multi-worker write check: starts gunicorn with several workers on a copy
+# of the data, has concurrent clients post /add_match, then checks that
+# every submission landed and that each rating chain is unbroken (the
+# previous new + diff == new for every player/character, and
+# characters.json holds the last logged value). A lost update shows up as
+# a missing match or a broken chain. The data directory is never changed.
+#
+#   python concurrency_check.py --workers 4 --clients 8 --matches 40
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PLAYERS = ["Load Test 1", "Load Test 2", "Load Test 3", "Load Test 4"]
+CHARACTERS = ["Mario", "Fox", "Kirby"]   # few pairs, so submissions collide
+AUTH = {"Authorization": "Basic " + base64.b64encode(b"check:check").decode()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check for lost updates under concurrent submissions.")
+    parser.add_argument("--data", default=".", help="data directory to copy")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--matches", type=int, default=40, help="submissions per client")
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args()
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def submit(job):
+    """One client: posts its matches one after another. Returns failed posts."""
+    port, client, count = job
+    failed = 0
+    for i in range(count):
+        n = client * count + i
+        form = (f"player1={PLAYERS[n % 4].replace(' ', '+')}&p1_character={CHARACTERS[n % 3]}"
+                f"&player2={PLAYERS[(n + 1) % 4].replace(' ', '+')}&p2_character={CHARACTERS[(n // 3) % 3]}"
+                f"&winner={'p1' if n % 2 else 'p2'}")
+        status = request(port, "POST", "/add_match", form,
+                         dict(AUTH, **{"Content-Type": "application/x-www-form-urlencoded"}))
+        if status != 302:
+            failed += 1
+    return failed
+
+
+def wait_for_server(port, server, seconds=30):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("gunicorn exited before serving")
+        try:
+            if request(port, "GET", "/matches", headers=AUTH) == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("gunicorn did not start")
+
+
+def check_chains(log, players, start):
+    """Problems with the matches after log[start:] (an empty list if none)."""
+    problems = []
+    latest = {}
+    for seq, m in enumerate(log[start:], start=start + 1):
+        for side in ("1", "2"):
+            key = (m["p" + side], m["c" + side])
+            if key[0] not in PLAYERS:
+                continue
+            old = m["new" + side] - m["diff" + side]
+            if latest.get(key, 1000) != old:
+                problems.append(f"match #{seq}: {key[0]} / {key[1]} started from {old}, "
+                                f"previous match left {latest.get(key, 1000)}")
+            latest[key] = m["new" + side]
+    for (name, char), value in latest.items():
+        saved = players.get(name, {}).get(char)
+        if saved != value:
+            problems.append(f"{name} / {char}: characters.json has {saved}, last match logged {value}")
+    return problems
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="elo_concurrency_")
+    data_dir = os.path.abspath(args.data)
+    for name in os.listdir(data_dir):
+        if name.endswith((".json", ".jsonl", ".db")):
+            shutil.copy(os.path.join(data_dir, name), workdir)
+
+    # app.py keeps its data in the working directory; no git push from here
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, ADMIN_USER_1="check:check",
+               PUSH_DEBOUNCE_SECONDS="3600", PUSH_MAX_DELAY_SECONDS="3600")
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import app as elo
+
+    before = len(elo.load_match_log())
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(args.workers), "-b", f"127.0.0.1:{args.port}", "app:app"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(args.port, server)
+        started = time.perf_counter()
+        with Pool(args.clients) as pool:
+            failed = sum(pool.map(submit, [(args.port, c, args.matches) for c in range(args.clients)]))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    expected = args.clients * args.matches
+    elo._snapshot_cache.clear()
+    log = elo.load_match_log()
+    problems = check_chains(log, elo.load_players(), before)
+    landed = len(log) - before
+    if failed:
+        problems.insert(0, f"{failed} submissions did not return a redirect")
+    if landed != expected:
+        problems.insert(0, f"{landed} of {expected} submissions were logged")
+
+    print(f"{args.clients} clients x {args.matches} matches against {args.workers} workers "
+          f"in {elapsed:.1f}s: {landed} logged.")
+    elo.push_queue.clear()
+    shutil.rmtree(workdir, ignore_errors=True)
+    if problems:
+        print("LOST UPDATES:")
+        for problem in problems[:50]:
+            print(f"  {problem}")
+        raise SystemExit(1)
+    print("Every rating chain is consistent.")
+
+
+if __name__ == "__main__":
+    main()
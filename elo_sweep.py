@@ -0,0 +1,292 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+from array import array
+from multiprocessing import Pool
+
+# What-if tuning for the ELO formula: replay the match log under many
+# parameter sets (grid or random search) across a process pool and rank
+# them by how well expected_score predicted the real results.
+#
+#   python elo_sweep.py --grid base_win=20,30,40 char_weight=0.6,0.7,0.8
+#   python elo_sweep.py --random 2000 --json sweep_results.json
+from app import (
+    calculate_elo_custom, match_table, match_table_order,
+    CHAR_FLOOR, DECAY_PER_DAY, DECAY_START_DAYS,
+)
+
+
+# Current formula (calculate_elo_custom + add_match's three-stock bonus)
+DEFAULTS = {
+    "base_win": 30,
+    "char_weight": 0.7,
+    "global_weight": 0.3,
+    "loss_ratio": 0.9,            # loss as a share of the winner's gain
+    "tier1_below": 0.01,          # "insane upset" when expected < this ...
+    "tier1_mult": 10.0,
+    "tier2_below": 0.10,          # "huge upset"
+    "tier2_mult": 6.0,
+    "tier3_below": 0.30,          # "big upset"
+    "tier3_mult": 3.0,
+    "normal_mult": 1.2,
+    "three_stock_mult": 2,
+    "decay_start_days": DECAY_START_DAYS,
+    "decay_per_day": DECAY_PER_DAY,
+}
+
+# Ranges for --random (uniform; ints stay ints)
+RANDOM_RANGES = {
+    "base_win": (10, 60),
+    "char_weight": (0.3, 1.0),
+    "global_weight": (0.0, 0.7),
+    "loss_ratio": (0.5, 1.1),
+    "tier1_mult": (1.0, 15.0),
+    "tier2_mult": (1.0, 10.0),
+    "tier3_mult": (1.0, 6.0),
+    "normal_mult": (0.0, 3.0),
+    "three_stock_mult": (1, 3),
+    "decay_start_days": (7, 60),
+    "decay_per_day": (0, 6),
+}
+
+
+def elo_step(params, p1_char, p2_char, p1_global, p2_global, p1_won):
+    """calculate_elo_custom with tunable constants. Returns (new1, new2, exp_p1)."""
+    c1 = p1_char * params["char_weight"] + p1_global * params["global_weight"]
+    c2 = p2_char * params["char_weight"] + p2_global * params["global_weight"]
+
+    exp_p1 = 1 / (1 + 10 ** ((c2 - c1) / 400))
+    expected = exp_p1 if p1_won else 1 - exp_p1
+
+    if expected < params["tier1_below"]:
+        winner_mult = 1 + params["tier1_mult"] * (0.5 - expected)
+    elif expected < params["tier2_below"]:
+        winner_mult = 1 + params["tier2_mult"] * (0.5 - expected)
+    elif expected < params["tier3_below"]:
+        winner_mult = 1 + params["tier3_mult"] * (0.5 - expected)
+    else:
+        winner_mult = 1 + params["normal_mult"] * (0.5 - expected)
+
+    gain = round(params["base_win"] * winner_mult)
+    loss = round(gain * params["loss_ratio"])
+
+    if p1_won:
+        new_p1 = p1_char + gain
+        new_p2 = p2_char - loss
+    else:
+        new_p1 = p1_char - loss
+        new_p2 = p2_char + gain
+
+    return max(1000, new_p1), max(1000, new_p2), exp_p1
+
+
+# -----------------------------
+# Compact match columns
+# -----------------------------
+
+def build_columns():
+    """Chronologically ordered columns (from match_table) shared by every replay."""
+    table = match_table()
+    order = match_table_order(table)
+    keys, unparsed = table["keys"], table["unparsed"]
+
+    columns = {name: array("i", (table[name][index] for index in order))
+               for name in ("p1", "c1", "p2", "c2")}
+    # Legacy entries have no real date, so they never trigger decay
+    columns["day"] = array("i", (-1 if index in unparsed else keys[index] // 1440 for index in order))
+    columns["p1_won"] = bytearray(table["p1_won"][index] for index in order)
+    columns["three_stock"] = bytearray(table["three_stock"][index] for index in order)
+    columns["n_players"] = len(table["player_names"])
+    columns["n_chars"] = len(table["char_names"])
+    return columns
+
+
+_columns = None
+
+def _init_worker(columns):
+    global _columns
+    _columns = columns
+
+
+def replay(params):
+    """Replays the shared columns under `params` and scores the predictions."""
+    cols = _columns
+    n_chars = cols["n_chars"]
+    ratings = [1000] * (cols["n_players"] * n_chars)
+    offsets = [0] * cols["n_players"]
+    last_day = [None] * cols["n_players"]
+    played = [[] for _ in range(cols["n_players"])]   # rated character slots
+
+    decay_start = params["decay_start_days"]
+    decay_per_day = params["decay_per_day"]
+    three_stock_mult = params["three_stock_mult"]
+
+    log_loss = 0.0
+    brier = 0.0
+    correct = 0
+    n = len(cols["p1"])
+
+    for i in range(n):
+        p1, p2 = cols["p1"][i], cols["p2"][i]
+        k1 = p1 * n_chars + cols["c1"][i]
+        k2 = p2 * n_chars + cols["c2"][i]
+        day = cols["day"][i]
+
+        for pid, key in ((p1, k1), (p2, k2)):
+            # Inactivity decay, same arithmetic as apply_decay_to_player
+            if decay_per_day and day >= 0 and last_day[pid] is not None:
+                days_of_decay = day - last_day[pid] - decay_start
+                if days_of_decay > 0 and played[pid]:
+                    per_char = decay_per_day / len(played[pid])
+                    per_char = int(per_char) if per_char >= 1 else 1
+                    total_decay = per_char * days_of_decay
+                    for slot in played[pid]:
+                        decayed = max(CHAR_FLOOR, int(ratings[slot] - total_decay))
+                        offsets[pid] += decayed - ratings[slot]
+                        ratings[slot] = decayed
+            if day >= 0:
+                last_day[pid] = day
+            if key not in played[pid]:
+                played[pid].append(key)
+
+        won = cols["p1_won"][i]
+        old1, old2 = ratings[k1], ratings[k2]
+        new1, new2, exp_p1 = elo_step(params, old1, old2, offsets[p1], offsets[p2], won)
+
+        # Score the prediction made before the result was known
+        p = min(max(exp_p1 if won else 1 - exp_p1, 1e-15), 1.0)
+        log_loss -= math.log(p)
+        brier += (exp_p1 - won) ** 2
+        if exp_p1 != 0.5 and (exp_p1 > 0.5) == bool(won):
+            correct += 1
+
+        if cols["three_stock"][i]:
+            # add_match: the winner's change is multiplied, the loser's is not
+            if won:
+                new1 = old1 + (new1 - old1) * three_stock_mult
+            else:
+                new2 = old2 + (new2 - old2) * three_stock_mult
+        new1 = max(1000, round(new1))
+        new2 = max(1000, round(new2))
+
+        ratings[k1] = new1
+        offsets[p1] += new1 - old1
+        prev2 = ratings[k2]
+        ratings[k2] = new2
+        offsets[p2] += new2 - prev2
+
+    return {
+        "params": params,
+        "log_loss": log_loss / n if n else 0.0,
+        "brier": brier / n if n else 0.0,
+        "accuracy": correct / n if n else 0.0,
+    }
+
+
+# -----------------------------
+# Parameter sets
+# -----------------------------
+
+def parse_grid(specs):
+    """["base_win=20,30", "char_weight=0.6,0.7"] -> list of full param dicts."""
+    axes = []
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in DEFAULTS:
+            raise SystemExit(f"Unknown parameter '{name}'. Choose from: {', '.join(DEFAULTS)}")
+        cast = int if isinstance(DEFAULTS[name], int) else float
+        axes.append([(name, cast(v)) for v in values.split(",") if v])
+
+    return [dict(DEFAULTS, **dict(combo)) for combo in itertools.product(*axes)]
+
+
+def random_params(count, seed):
+    rng = random.Random(seed)
+    sets = []
+    for _ in range(count):
+        params = dict(DEFAULTS)
+        for name, (low, high) in RANDOM_RANGES.items():
+            if isinstance(DEFAULTS[name], int):
+                params[name] = rng.randint(low, high)
+            else:
+                params[name] = round(rng.uniform(low, high), 3)
+        sets.append(params)
+    return sets
+
+
+def check_defaults():
+    """The default parameters must reproduce calculate_elo_custom exactly."""
+    rng = random.Random(0)
+    for _ in range(2000):
+        r1, r2 = rng.randint(1000, 2500), rng.randint(1000, 2500)
+        g1, g2 = rng.randint(0, 5000), rng.randint(0, 5000)
+        won = rng.random() < 0.5
+        expected = calculate_elo_custom(r1, r2, g1, g2, "p1" if won else "p2")
+        if elo_step(DEFAULTS, r1, r2, g1, g2, won)[:2] != expected:
+            raise SystemExit("elo_step no longer matches calculate_elo_custom; update DEFAULTS.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the match log under many ELO parameter sets.")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2",
+                        help="grid search over the listed values")
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="add N random parameter sets")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rank", choices=["log_loss", "brier"], default="log_loss")
+    parser.add_argument("--top", type=int, default=20, help="rows to print")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", help="write every result to this file")
+    args = parser.parse_args()
+
+    matches = match_table()["length"]
+    if not matches:
+        raise SystemExit("No match history found.")
+    check_defaults()
+
+    param_sets = [dict(DEFAULTS)]
+    if args.grid:
+        param_sets += parse_grid(args.grid)
+    if args.random:
+        param_sets += random_params(args.random, args.seed)
+
+    columns = build_columns()
+    print(f"Replaying {matches} matches under {len(param_sets)} parameter sets "
+          f"on {args.workers} workers...")
+
+    started = time.time()
+    with Pool(args.workers, initializer=_init_worker, initargs=(columns,)) as pool:
+        results = pool.map(replay, param_sets, chunksize=max(1, len(param_sets) // (args.workers * 4)))
+    elapsed = time.time() - started
+
+    for result in results:
+        result["baseline"] = result["params"] == DEFAULTS
+    results.sort(key=lambda r: r[args.rank])
+
+    # Only show the parameters that actually vary
+    varying = [name for name in DEFAULTS if len({repr(r["params"][name]) for r in results}) > 1]
+
+    header = ["#", "log_loss", "brier", "acc"] + varying
+    print("  ".join(f"{h:>10}" for h in header))
+    for rank, result in enumerate(results[:args.top], start=1):
+        row = [f"{rank}{'*' if result['baseline'] else ''}",
+               f"{result['log_loss']:.4f}", f"{result['brier']:.4f}", f"{result['accuracy']:.3f}"]
+        row += [str(result["params"][name]) for name in varying]
+        print("  ".join(f"{cell:>10}" for cell in row))
+
+    baseline_rank = next(i for i, r in enumerate(results, start=1) if r["baseline"])
+    print(f"\n* current formula (rank {baseline_rank} of {len(results)}). "
+          f"{len(param_sets)} replays in {elapsed:.1f}s.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rank_by": args.rank, "matches": matches, "results": results}, f, indent=4)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
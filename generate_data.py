@@ -0,0 +1,184 @@
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+# Synthetic data at any scale for load testing and benchmark.py. Writes a
+# complete data directory (characters.json, the match log, Mom's House
+# files) whose ratings are exactly what rebuild_match_log.py would produce
+# from the generated history.
+#
+#   python generate_data.py --out synthetic --players 50 --matches 1000000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Smash ELO data directory.")
+    parser.add_argument("--out", default="synthetic", help="directory to write (created if missing)")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--matches", type=int, default=100000)
+    parser.add_argument("--moms-events", type=int, default=None,
+                        help="Mom's House results (default: one per 50 matches)")
+    parser.add_argument("--max-entrants", type=int, default=8, help="largest Mom's House event")
+    parser.add_argument("--years", type=float, default=3.0, help="history length, ending now")
+    parser.add_argument("--format", choices=["journal", "json"], default="journal",
+                        help="match log storage: match_log.jsonl (default) or match_log.json")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.makedirs(args.out, exist_ok=True)
+if os.listdir(args.out):
+    sys.exit(f"{args.out} is not empty.")
+
+# app.py keeps its data in the working directory
+os.chdir(args.out)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app import (
+    CHARACTERS, MATCH_TIMEZONE,
+    DATA_FILE, LAST_RESULT_FILE, MATCH_LOG_FILE, MATCH_LOG_JOURNAL,
+    MOMS_HOUSE_FILE, MOMS_HOUSE_LOG_FILE, MOMS_HOUSE_LOG_JOURNAL, MOMS_HOUSE_LAST_FILE,
+    normalize_match, rate_moms_house_event, replay_ratings,
+    write_journal, write_json_atomic,
+)
+
+rng = random.Random(args.seed)
+moms_events = args.matches // 50 if args.moms_events is None else args.moms_events
+
+
+# -----------------------------
+# Players
+# -----------------------------
+# Each player has a skill level, an activity weight (a few regulars play
+# most of the matches) and a short list of mains they pick most of the time.
+
+names = [f"Player {i + 1:03d}" for i in range(args.players)]
+skill = {name: rng.gauss(0, 150) for name in names}
+activity = {name: rng.paretovariate(1.5) for name in names}
+mains = {}
+for name in names:
+    picks = rng.sample(CHARACTERS, rng.randint(2, 8))
+    # Zipf-like: the first main is picked far more than the last
+    mains[name] = (picks, [1 / (rank + 1) for rank in range(len(picks))])
+proficiency = {name: {c: rng.gauss(40, 30) for c in mains[name][0]} for name in names}
+
+weights = [activity[name] for name in names]
+
+
+def pick_character(name):
+    if rng.random() < 0.1:
+        return rng.choice(CHARACTERS)       # the occasional random pick
+    picks, pick_weights = mains[name]
+    return rng.choices(picks, pick_weights)[0]
+
+
+def strength(name, char):
+    return skill[name] + proficiency[name].get(char, -40)
+
+
+def timestamps(count):
+    """Increasing times over the last --years, bunched into evening sessions."""
+    end = datetime.now(MATCH_TIMEZONE).replace(tzinfo=None)
+    start = end - timedelta(days=365 * args.years)
+    days = max(1, int((end - start).days))
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    times = [
+        midnight + timedelta(days=rng.randrange(days), minutes=18 * 60 + rng.randrange(6 * 60))
+        for _ in range(count)
+    ]
+    return sorted(times)
+
+
+# -----------------------------
+# Matches
+# -----------------------------
+
+print(f"Generating {args.matches} matches for {args.players} players...")
+
+match_log = []
+for when in timestamps(args.matches):
+    p1, p2 = rng.choices(names, weights, k=2)
+    while p2 == p1:
+        p2 = rng.choices(names, weights)[0]
+    c1, c2 = pick_character(p1), pick_character(p2)
+
+    p1_win = 1 / (1 + 10 ** ((strength(p2, c2) - strength(p1, c1)) / 400))
+    p1_won = rng.random() < p1_win
+    margin = abs(p1_win - 0.5)
+
+    match_log.append({
+        "timestamp": when.strftime("%Y-%m-%d %I:%M %p"),
+        "p1": p1,
+        "c1": c1,
+        "new1": 1000,
+        "diff1": 0,
+        "p2": p2,
+        "c2": c2,
+        "new2": 1000,
+        "diff2": 0,
+        "winner": "p1" if p1_won else "p2",
+        "three_stock": rng.random() < 0.04 + margin * 0.3,
+    })
+
+print("Rating the history...")
+players, results = replay_ratings(match_log)
+for seq, (match, result) in enumerate(zip(match_log, results), start=1):
+    match["new1"], match["diff1"], match["new2"], match["diff2"] = result
+    normalize_match(match, seq)
+
+write_json_atomic(DATA_FILE, players)
+if args.format == "journal":
+    write_journal(MATCH_LOG_JOURNAL, match_log)
+else:
+    write_json_atomic(MATCH_LOG_FILE, match_log)
+
+if match_log:
+    last = match_log[-1]
+    write_json_atomic(LAST_RESULT_FILE, {
+        "p1": last["p1"], "c1": last["c1"], "new1": last["new1"], "diff1": last["diff1"],
+        "p2": last["p2"], "c2": last["c2"], "new2": last["new2"], "diff2": last["diff2"],
+        "last_player1": last["p1"], "last_player2": last["p2"],
+        "last_char1": last["c1"], "last_char2": last["c2"],
+    })
+
+
+# -----------------------------
+# Mom's House
+# -----------------------------
+# Rated with record_moms_house's arithmetic (pairwise deltas, floor at 1000).
+
+print(f"Generating {moms_events} Mom's House results...")
+
+moms_house = {}
+moms_log = []
+for when in timestamps(moms_events):
+    entrants = set()
+    while len(entrants) < min(rng.randint(2, args.max_entrants), len(names)):
+        entrants.add(rng.choices(names, weights)[0])
+    placements = sorted(entrants, key=lambda name: skill[name] + rng.gauss(0, 120), reverse=True)
+
+    before, after, delta = rate_moms_house_event(moms_house, placements)
+    moms_log.append({
+        "timestamp": when.strftime("%Y-%m-%d %I:%M %p"),
+        "placements": placements,
+        "before": before,
+        "after": after,
+        "delta": delta,
+    })
+
+if moms_log:
+    # Every known player has a rating, as /scoreboard would set up
+    for name in players:
+        moms_house.setdefault(name, 1000)
+    write_json_atomic(MOMS_HOUSE_FILE, moms_house)
+    if args.format == "journal":
+        write_journal(MOMS_HOUSE_LOG_JOURNAL, moms_log)
+    else:
+        write_json_atomic(MOMS_HOUSE_LOG_FILE, moms_log)
+    last = moms_log[-1]
+    write_json_atomic(MOMS_HOUSE_LAST_FILE, {k: last[k] for k in ("timestamp", "placements", "after", "delta")})
+
+size = sum(os.path.getsize(f) for f in os.listdir(".") if os.path.isfile(f))
+print(f"\nWrote {len(players)} players, {len(match_log)} matches and {len(moms_log)} "
+      f"Mom's House results to {os.getcwd()} ({size / 1e6:.1f} MB).")
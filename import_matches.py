@@ -0,0 +1,61 @@
+import argparse
+
+# Bulk match import: rates a CSV (header row) or JSON lines file of results
+# in order and saves them all at once, like the admin panel's import form.
+# Nothing is saved if any row is invalid, older than the last logged
+# match or (with a timestamp) already logged. Rows without a timestamp get
+# the import time, so importing them twice adds them twice.
+#
+#   python import_matches.py session.csv --dry-run
+#   python import_matches.py session.jsonl
+from app import parse_import, import_matches, queue_push, flush_push_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a file of match results in one go.")
+    parser.add_argument("file", help="CSV or JSONL file of matches")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: guessed from the contents")
+    parser.add_argument("--dry-run", action="store_true", help="show the rating changes without saving")
+    parser.add_argument("--no-push", action="store_true", help="save locally without syncing to GitHub")
+    parser.add_argument("--top", type=int, default=50, help="rows to print per table")
+    args = parser.parse_args()
+
+    with open(args.file, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+    try:
+        report = import_matches(parse_import(text, args.format), dry_run=args.dry_run)
+    except ValueError as e:
+        report = {"errors": [str(e)]}
+
+    if report["errors"]:
+        print("Nothing imported:")
+        for error in report["errors"]:
+            print(f"  {error}")
+        raise SystemExit(1)
+
+    matches, changes = report["matches"], report["changes"]
+    print(f"{len(matches)} matches, {len(changes)} rating changes")
+    if report["untimestamped"]:
+        print(f"{report['untimestamped']} rows without a timestamp (not recognized if imported again)")
+    if report["new_players"]:
+        print(f"New players: {', '.join(report['new_players'])}")
+
+    print("\nRating changes")
+    for c in changes[:args.top]:
+        before = "new" if c["before"] is None else c["before"]
+        print(f"  {c['player']:<20}{c['character']:<24}{before:>6} -> {c['after']}")
+    if len(changes) > args.top:
+        print(f"  ... and {len(changes) - args.top} more")
+
+    if args.dry_run:
+        print("\nDry run: nothing was saved.")
+        return
+
+    print(f"\nImported {len(matches)} matches.")
+    if not args.no_push:
+        queue_push(f"Auto-update from bulk import ({len(matches)} matches)")
+        flush_push_queue()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import json
+from collections import Counter
+
+# Full-history analytics (character win rates, head-to-head records,
+# longest win streaks) scanned from the columnar match store instead of
+# the parsed log. Uses NumPy when it's installed; the plain-Python scan
+# over the same mapped columns gives identical results.
+#
+#   python match_analytics.py --top 15
+#   python match_analytics.py --player "Will" --json analytics.json
+from app import open_match_columns
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# -----------------------------
+# Vectorized scans (NumPy)
+# -----------------------------
+
+def numpy_scan(cols):
+    """(appearances, wins, h2h wins, longest streaks) with whole-column passes."""
+    n_players, n_chars = len(cols["players"]), len(cols["characters"])
+    p1, c1 = numpy.asarray(cols["p1"]), numpy.asarray(cols["c1"])
+    p2, c2 = numpy.asarray(cols["p2"]), numpy.asarray(cols["c2"])
+    p1_won = numpy.asarray(cols["p1_won"]).astype(bool)
+
+    played = numpy.bincount(c1, minlength=n_chars) + numpy.bincount(c2, minlength=n_chars)
+    won = numpy.bincount(numpy.where(p1_won, c1, c2), minlength=n_chars)
+
+    # Winner x loser win counts, flattened
+    winners = numpy.where(p1_won, p1, p2).astype(numpy.int64)
+    losers = numpy.where(p1_won, p2, p1)
+    h2h = numpy.bincount(winners * n_players + losers, minlength=n_players * n_players)
+
+    # Every match as two appearances in time order, loser first (so a
+    # self-match ends the streak and then starts one, as in python_scan)
+    order = numpy.argsort(numpy.asarray(cols["keys"]), kind="stable")
+    appearances = numpy.column_stack((losers[order], winners[order])).ravel()
+    results = numpy.tile(numpy.array([False, True]), len(order))
+    # Grouped by player, still in time order; runs of wins within a group
+    by_player = numpy.argsort(appearances, kind="stable")
+    appearances, results = appearances[by_player], results[by_player]
+    streaks = numpy.zeros(n_players, dtype=numpy.int64)
+    if len(results):
+        new_player = numpy.diff(appearances) != 0
+        edges = numpy.concatenate(([True], new_player | (numpy.diff(results.view(numpy.int8)) != 0), [True]))
+        bounds = numpy.flatnonzero(edges)
+        starts, lengths = bounds[:-1], numpy.diff(bounds)
+        wins = results[starts]
+        numpy.maximum.at(streaks, appearances[starts[wins]], lengths[wins])
+
+    return played.tolist(), won.tolist(), h2h.reshape(n_players, n_players).tolist(), streaks.tolist()
+
+
+# -----------------------------
+# Plain scans (no NumPy)
+# -----------------------------
+
+def python_scan(cols):
+    n_players, n_chars = len(cols["players"]), len(cols["characters"])
+    p1, c1, p2, c2, p1_won = cols["p1"], cols["c1"], cols["p2"], cols["c2"], cols["p1_won"]
+    keys = cols["keys"]
+
+    played = [0] * n_chars
+    won = [0] * n_chars
+    h2h = [[0] * n_players for _ in range(n_players)]
+    for i in range(cols["length"]):
+        played[c1[i]] += 1
+        played[c2[i]] += 1
+        if p1_won[i]:
+            won[c1[i]] += 1
+            h2h[p1[i]][p2[i]] += 1
+        else:
+            won[c2[i]] += 1
+            h2h[p2[i]][p1[i]] += 1
+
+    streaks = [0] * n_players
+    current = [0] * n_players
+    for i in sorted(range(cols["length"]), key=keys.__getitem__):
+        winner, loser = (p1[i], p2[i]) if p1_won[i] else (p2[i], p1[i])
+        current[loser] = 0
+        current[winner] += 1
+        streaks[winner] = max(streaks[winner], current[winner])
+
+    return played, won, h2h, streaks
+
+
+# -----------------------------
+# Report
+# -----------------------------
+
+def summarize(cols, played, won, h2h, streaks, min_games):
+    players, chars = cols["players"], cols["characters"]
+    character_rates = sorted(
+        ({"character": chars[c], "matches": played[c], "wins": won[c], "win_rate": won[c] / played[c]}
+         for c in range(len(chars)) if played[c] >= min_games),
+        key=lambda row: (-row["win_rate"], row["character"]),
+    )
+    head_to_head = {
+        players[a]: {players[b]: {"wins": h2h[a][b], "losses": h2h[b][a]}
+                     for b in range(len(players)) if h2h[a][b] or h2h[b][a]}
+        for a in range(len(players))
+    }
+    longest_streaks = sorted(({"player": players[p], "streak": streaks[p]} for p in range(len(players))),
+                             key=lambda row: (-row["streak"], row["player"]))
+    return {"matches": cols["length"], "character_win_rates": character_rates,
+            "head_to_head": head_to_head, "longest_win_streaks": longest_streaks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-history analytics from the columnar match store.")
+    parser.add_argument("--top", type=int, default=10, help="rows to print per table")
+    parser.add_argument("--min-games", type=int, default=20, help="matches a character needs to be ranked")
+    parser.add_argument("--player", help="also print this player's head-to-head records")
+    parser.add_argument("--no-numpy", action="store_true", help="use the plain-Python scan")
+    parser.add_argument("--json", help="write the full report to this file")
+    args = parser.parse_args()
+
+    cols = open_match_columns()
+    if not cols["length"]:
+        raise SystemExit("No match history found.")
+
+    use_numpy = numpy is not None and not args.no_numpy
+    report = summarize(cols, *(numpy_scan if use_numpy else python_scan)(cols), args.min_games)
+    print(f"{report['matches']} matches, {len(cols['players'])} players "
+          f"({'NumPy' if use_numpy else 'plain Python'} scan)")
+
+    print(f"\nCharacter win rates (at least {args.min_games} matches)")
+    for row in report["character_win_rates"][:args.top]:
+        print(f"  {row['character']:<24}{row['win_rate']:>7.1%}{row['matches']:>8}")
+
+    print("\nLongest win streaks")
+    for row in report["longest_win_streaks"][:args.top]:
+        print(f"  {row['player']:<24}{row['streak']:>6}")
+
+    if args.player:
+        records = report["head_to_head"].get(args.player)
+        if records is None:
+            raise SystemExit(f"No matches for '{args.player}'.")
+        print(f"\n{args.player} head to head")
+        totals = Counter({name: r["wins"] + r["losses"] for name, r in records.items()})
+        for name, _ in totals.most_common(args.top):
+            print(f"  {name:<24}{records[name]['wins']:>5}-{records[name]['losses']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
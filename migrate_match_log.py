@@ -0,0 +1,42 @@
+import json
+import os
+from datetime import datetime
+
+# One-shot conversion of the JSON array logs into append-only journals.
+# After this runs, app.py reads and appends to the .jsonl files instead.
+from app import (
+    MATCH_LOG_FILE, MATCH_LOG_JOURNAL,
+    MOMS_HOUSE_LOG_FILE, MOMS_HOUSE_LOG_JOURNAL,
+    data_lock, journal_segments, write_journal,
+)
+
+
+print("=== MIGRATING MATCH LOGS TO JOURNALS ===")
+
+timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+# Submissions wait while a log is converted and moved aside
+with data_lock():
+    for source, journal in [
+        (MATCH_LOG_FILE, MATCH_LOG_JOURNAL),
+        (MOMS_HOUSE_LOG_FILE, MOMS_HOUSE_LOG_JOURNAL),
+    ]:
+        if journal_segments(journal):
+            print(f"{journal} already exists, skipping.")
+            continue
+        if not os.path.exists(source):
+            print(f"{source} not found, skipping.")
+            continue
+
+        with open(source, "r") as f:
+            records = json.load(f)
+
+        write_journal(journal, records)
+
+        # Keep the old array file as a backup so the journal is the only live copy
+        backup = f"{source[:-len('.json')]}_backup_{timestamp}.json"
+        os.rename(source, backup)
+
+        print(f"{source} -> {journal} ({len(records)} records, backup at {backup})")
+
+print("\n=== MIGRATION COMPLETE ===")
@@ -0,0 +1,38 @@
+import json
+from datetime import datetime
+
+# One-shot normalization of the match log: every entry gets "seq" (its
+# 1-based position) and "time" (ISO 8601 with UTC offset, null for legacy
+# "N/A" entries). New matches get both when they are appended.
+from app import data_lock, load_match_log, save_match_log, normalize_match
+
+
+def save_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
+
+
+print("=== NORMALIZING MATCH TIMESTAMPS ===")
+
+with data_lock():
+    match_log = [dict(m) for m in load_match_log()]
+    if not match_log:
+        print("No match history found.")
+        exit(0)
+
+    if all(m.get("seq") == seq and "time" in m for seq, m in enumerate(match_log, start=1)):
+        print("Match log is already normalized.")
+        exit(0)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    save_json(f"match_log_backup_{timestamp}.json", match_log)
+    print("Backup created.")
+
+    for seq, match in enumerate(match_log, start=1):
+        normalize_match(match, seq)
+    save_match_log(match_log)
+
+legacy = sum(1 for m in match_log if m["time"] is None)
+print(f"{len(match_log)} matches normalized ({legacy} without a usable timestamp).")
+
+print("\n=== MIGRATION COMPLETE ===")
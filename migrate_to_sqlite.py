@@ -0,0 +1,54 @@
+import os
+import sys
+
+# One-shot import of the JSON files into the SQLite backend, and the reverse
+# export. After importing, run the app with STORAGE_BACKEND=sqlite.
+#
+#   python migrate_to_sqlite.py            # JSON files -> elo.db
+#   python migrate_to_sqlite.py --export   # elo.db -> JSON files
+import app
+from app import (
+    SQLITE_FILE, data_lock,
+    db_save_document, db_save_moms_house, db_save_players,
+    db_write_log, export_json,
+)
+
+
+if "--export" in sys.argv:
+    print("=== EXPORTING SQLITE TO JSON ===")
+    if not os.path.exists(SQLITE_FILE):
+        sys.exit(f"{SQLITE_FILE} not found.")
+    export_json()
+    print("\n=== EXPORT COMPLETE ===")
+    sys.exit()
+
+print("=== MIGRATING JSON DATA TO SQLITE ===")
+
+# No submission may land between reading the JSON files and writing elo.db
+with data_lock():
+    if os.path.exists(SQLITE_FILE):
+        sys.exit(f"{SQLITE_FILE} already exists; move it aside to migrate again.")
+
+    # Read everything through the JSON side of the helpers
+    app.STORAGE_BACKEND = "json"
+    players = app.load_players()
+    last_result = app.load_last_result()
+    match_log = app.load_match_log()
+    moms_house = app.load_moms_house()
+    moms_house_log = app.load_moms_house_log()
+    moms_house_last = app.load_moms_house_last_result()
+
+    db_save_players(players)
+    db_write_log("matches", match_log)
+    db_save_moms_house(moms_house)
+    db_write_log("moms_house_events", moms_house_log)
+    if last_result:
+        db_save_document("last_result", last_result)
+    if moms_house_last:
+        db_save_document("moms_house_last_result", moms_house_last)
+
+print(f"{len(players)} players, {len(match_log)} matches, "
+      f"{len(moms_house)} Mom's House ratings, {len(moms_house_log)} Mom's House events -> {SQLITE_FILE}")
+print("Set STORAGE_BACKEND=sqlite to use it.")
+
+print("\n=== MIGRATION COMPLETE ===")
@@ -1,20 +1,16 @@
+import argparse
 import json
 import os
 from datetime import datetime
 
-# Files
-DATA_FILE = "characters.json"
-MATCH_LOG_FILE = "match_log.json"
-
-# Import your ELO components from app.py
-from app import calculate_elo_custom, CHARACTERS, compute_global_elo
-
-
-def load_json(path, default):
-    if not os.path.exists(path):
-        return default
-    with open(path, "r") as f:
-        return json.load(f)
+# Import your ELO components and storage helpers from app.py
+from app import (
+    chronological_order, replay_ratings, sorted_prefix_length,
+    find_checkpoint, save_checkpoint, clear_checkpoints, prefix_hashes, prefix_digest,
+    DATA_FILE, load_match_log, save_match_log, save_players, normalize_match,
+    bump_data_version, data_lock, load_players, match_table, match_table_order, replay_table,
+    ratings_as_of,
+)
 
 
 def save_json(path, data):
@@ -22,124 +18,136 @@ def save_json(path, data):
         json.dump(data, f, indent=4)
 
 
+def rating_differences(expected, actual):
+    """(player, character, expected, actual) for every character rating the
+    two {player: {char: rating}} maps disagree on. Unrated is 1000."""
+    differences = []
+    for name in sorted(set(expected) | set(actual)):
+        mine, theirs = expected.get(name, {}), actual.get(name, {})
+        for char in sorted(set(mine) | set(theirs)):
+            a, b = mine.get(char, 1000), theirs.get(char, 1000)
+            if isinstance(a, int) and isinstance(b, int) and a != b:
+                differences.append((name, char, a, b))
+    return differences
+
+
+def check():
+    """A full replay and the logged ratings at the end of the log must both
+    equal characters.json (true right after a rebuild)."""
+    stored = load_players()
+    table = match_table()
+    replayed, _ = replay_table(table, match_table_order(table))
+    logged, _ = ratings_as_of(datetime.max)
+    failed = False
+    for label, ratings in (("Full replay", replayed), ("Logged ratings", logged)):
+        differences = rating_differences(ratings, stored)
+        print(f"{label}: {len(differences)} ratings differ from {DATA_FILE}.")
+        for name, char, a, b in differences[:20]:
+            print(f"  {name} / {char}: {a} vs {b}")
+        failed = failed or bool(differences)
+    return not failed
+
+
+parser = argparse.ArgumentParser(description="Rebuild ELO ratings from the match log.")
+parser.add_argument("--check", action="store_true",
+                    help="only compare a full replay with the saved ratings")
+args = parser.parse_args()
+
+if args.check:
+    exit(0 if check() else 1)
+
+
+def report(done, total):
+    print(f"Processed {done}/{total} matches...")
+
+
+def checkpoint(done, players, offsets):
+    save_checkpoint(match_log_sorted[done - 1], done, prefix_digest(sorted_hashes, done),
+                    players, offsets, rebuilt=True)
+
+
 print("=== REBUILDING ELO FROM MATCH HISTORY ===")
 
-# ------------------------
-# 1. LOAD DATA & BACKUP
-# ------------------------
-players = {}
-match_log = load_json(MATCH_LOG_FILE, [])
-
-if not match_log:
-    print("No match history found. Cannot rebuild.")
-    exit(1)
-
-# Backup old files
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-os.system(f"cp {DATA_FILE} characters_backup_{timestamp}.json")
-os.system(f"cp {MATCH_LOG_FILE} match_log_backup_{timestamp}.json")
-
-print("Backups created.")
-
-
-# ------------------------
-# 2. RESET ALL RATINGS
-# ------------------------
-players = {}  # fully empty
-print("Ratings cleared. Beginning replay...")
-
-
-
-# ----------------------------------------
-# 3. SAFE CHRONOLOGICAL SORTING
-# ----------------------------------------
-fixed_matches = []
-fallback_start = datetime(2000, 1, 1, 0, 0)
-
-for index, m in enumerate(match_log):
-    ts = m.get("timestamp", "")
-
-    # Try to parse 12-hour first, then legacy 24-hour
-    try:
-        parsed = datetime.strptime(ts, "%Y-%m-%d %I:%M %p")
-    except Exception:
-        try:
-            parsed = datetime.strptime(ts, "%Y-%m-%d %H:%M")
-        except Exception:
-            # Assign a synthetic timestamp so order is preserved
-            parsed = fallback_start.replace(
-                hour=(index // 60) % 24,
-                minute=index % 60
-            )
-            m["timestamp"] = "N/A"
-
-    m["_parsed_time"] = parsed
-    fixed_matches.append(m)
-
-match_log_sorted = sorted(fixed_matches, key=lambda m: m["_parsed_time"])
-
-
-
-for i, match in enumerate(match_log_sorted, start=1):
-    p1 = match["p1"]
-    c1 = match["c1"]
-    p2 = match["p2"]
-    c2 = match["c2"]
-    winner = match["winner"]
-
-    # Initialize players & characters at 1000
-    if p1 not in players:
-        players[p1] = {}
-    if p2 not in players:
-        players[p2] = {}
-    if c1 not in players[p1]:
-        players[p1][c1] = 1000
-    if c2 not in players[p2]:
-        players[p2][c2] = 1000
-
-    old1 = players[p1][c1]
-    old2 = players[p2][c2]
-
-    # Compute global ratings BEFORE this match
-    p1_global = compute_global_elo(p1, players)
-    p2_global = compute_global_elo(p2, players)
-
-    # Recompute match ELO using your new system
-    new1, new2 = calculate_elo_custom(
-        old1, old2,
-        p1_global, p2_global,
-        winner
-    )
+# The whole rebuild holds the data lock, so no submission lands in between
+with data_lock():
+    # ------------------------
+    # 1. LOAD DATA & BACKUP
+    # ------------------------
+    match_log = [dict(m) for m in load_match_log()]
+
+    if not match_log:
+        print("No match history found. Cannot rebuild.")
+        exit(1)
+
+    # Backup old files
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.system(f"cp {DATA_FILE} characters_backup_{timestamp}.json")
+    save_json(f"match_log_backup_{timestamp}.json", match_log)
+
+    print("Backups created.")
+
+
+    # ----------------------------------------
+    # 2. SAFE CHRONOLOGICAL SORTING
+    # ----------------------------------------
+    # Timestamps are parsed once; entries without a usable one keep their
+    # relative position and are marked "N/A"
+    order, unparsed = chronological_order(match_log)
 
-    # Update ratings
-    players[p1][c1] = new1
-    players[p2][c2] = new2
+    for index in unparsed:
+        match_log[index]["timestamp"] = "N/A"
 
-    # Update diffs inside match log entry
-    match["new1"] = new1
-    match["new2"] = new2
-    match["diff1"] = new1 - old1
-    match["diff2"] = new2 - old2
 
-    if i % 50 == 0:
-        print(f"Processed {i}/{len(match_log_sorted)} matches...")
+    # ----------------------------------------
+    # 3. REPLAY FROM THE LAST REBUILD CHECKPOINT
+    # ----------------------------------------
+    # Entries before a checkpoint written by an earlier rebuild already hold
+    # replayed values, so only the tail after it needs replaying (as long as
+    # that prefix is still in chronological order and unchanged)
+    start = find_checkpoint(len(match_log), prefix_hashes(match_log),
+                            limit=sorted_prefix_length(order), rebuilt_only=True)
+    first = start["position"] if start else 0
+
+    if start:
+        print(f"Resuming from checkpoint at match {first}. Beginning replay...")
+    else:
+        print("Ratings cleared. Beginning replay...")
+
+    # Later checkpoints describe the old log order
+    clear_checkpoints(after=first)
+
+    match_log_sorted = [match_log[index] for index in order]
+    sorted_hashes = prefix_hashes(match_log_sorted)
+
+    players, results = replay_ratings(
+        match_log, order[first:], start=start,
+        progress=report, checkpoint=checkpoint
+    )
+
+    for index in order[first:]:
+        # Update diffs inside match log entry
+        match = match_log[index]
+        match["new1"], match["diff1"], match["new2"], match["diff2"] = results[index]
 
 
+    # ------------------------
+    # 4. SAVE NEW MATCH LOG + PLAYER RATINGS
+    # ------------------------
 
-# ------------------------
-# 4. SAVE NEW MATCH LOG + PLAYER RATINGS
-# ------------------------
+    # Sequence numbers follow the new log order
+    for seq, match in enumerate(match_log_sorted, start=1):
+        if match["timestamp"] == "N/A":
+            match["time"] = None
+        normalize_match(match, seq)
 
-# Remove temporary timestamp field
-for m in match_log_sorted:
-    if "_parsed_time" in m:
-        del m["_parsed_time"]
+    # Save new match log with updated ELO + diffs
+    save_match_log(match_log_sorted)
 
-# Save new match log with updated ELO + diffs
-save_json(MATCH_LOG_FILE, match_log_sorted)
+    # Save rebuilt player ratings
+    save_players(players)
 
-# Save rebuilt player ratings
-save_json(DATA_FILE, players)
+    # Cached pages (ETags) must not survive the rebuild
+    bump_data_version()
 
 print("\n=== REBUILD COMPLETE ===")
 print(f"Total players: {len(players)}")
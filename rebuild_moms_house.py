@@ -0,0 +1,73 @@
+import argparse
+import json
+from datetime import datetime
+
+# Re-derives Mom's House ratings from the placements in the event log:
+# every event's before/after/delta is recomputed in chronological order
+# with record_moms_house's arithmetic (pairwise deltas, floor at 1000) and
+# moms_house.json is rewritten to match.
+#
+#   python rebuild_moms_house.py --dry-run    # only report what would change
+from app import (
+    chronological_order, replay_moms_house, data_lock, bump_data_version,
+    load_moms_house, save_moms_house, load_moms_house_log, save_moms_house_log,
+    save_moms_house_last_result,
+)
+
+
+def save_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
+
+
+parser = argparse.ArgumentParser(description="Rebuild Mom's House ratings from the event log.")
+parser.add_argument("--dry-run", action="store_true", help="report differences without saving")
+args = parser.parse_args()
+
+print("=== REBUILDING MOM'S HOUSE FROM EVENT LOG ===")
+
+with data_lock():
+    moms_log = [dict(e) for e in load_moms_house_log()]
+    current = dict(load_moms_house())
+    if not moms_log:
+        print("No Mom's House history found. Cannot rebuild.")
+        exit(1)
+
+    if not args.dry_run:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        save_json(f"moms_house_backup_{timestamp}.json", current)
+        save_json(f"moms_house_log_backup_{timestamp}.json", moms_log)
+        print("Backups created.")
+
+    # Same stable timestamp sort as the match rebuild
+    order, unparsed = chronological_order(moms_log)
+    moms_log_sorted = [moms_log[index] for index in order]
+    if unparsed:
+        print(f"{len(unparsed)} events have no usable timestamp and keep their position.")
+
+    # Players who never entered an event stay at 1000
+    ratings, events = replay_moms_house(moms_log_sorted, {name: 1000 for name in current})
+
+    changed_events = sum(1 for old, new in zip(moms_log_sorted, events)
+                         if any(old.get(k) != new[k] for k in ("before", "after", "delta")))
+    changed_players = sorted(name for name in ratings if current.get(name) != ratings[name])
+    print(f"{len(events)} events replayed, {changed_events} with different results, "
+          f"{len(changed_players)} ratings changed.")
+    if order != list(range(len(order))):
+        print("Events were re-sorted by timestamp.")
+    for name in changed_players[:20]:
+        print(f"  {name}: {current.get(name, '-')} -> {ratings[name]}")
+
+    if args.dry_run:
+        print("\nDry run; nothing saved.")
+        exit(0)
+
+    save_moms_house_log(events)
+    save_moms_house(ratings)
+    last = events[-1]
+    save_moms_house_last_result({k: last[k] for k in ("timestamp", "placements", "after", "delta")})
+    bump_data_version()
+
+print("\n=== REBUILD COMPLETE ===")
+print(f"Total players: {len(ratings)}")
+print(f"Total events processed: {len(events)}")